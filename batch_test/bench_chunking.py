@@ -0,0 +1,60 @@
+"""
+Product chunking 벤치마크: 고정 개수 chunk (100개) vs token budget packing (정규화 + 중복/무정보 product 제거)
+genome 당 LLM 호출 수 (chunk 수) 와 prompt token 길이 분포 (최대값이 budget 이하인지) 비교
+LLM 호출 없이 tokenizer 만 사용
+"""
+import sys
+import json
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from main.generate_tags import (LLM_PROMPT_TOKENS, chunk_products, get_token_counter, pack_products,
+                                prepare_products, prompt_gen_tags)
+
+
+def summarize(label, chunks, count_tokens, budget):
+    tokens = [count_tokens(prompt_gen_tags(chunk)) for chunk in chunks]
+    over = sum(t > budget for t in tokens)
+    result = {"chunks": len(chunks), "max_tokens": max(tokens), "min_tokens": min(tokens),
+              "mean_tokens": round(sum(tokens) / len(tokens), 1), "over_budget": over,
+              "fill": round(sum(tokens) / (len(tokens) * budget), 3)}
+    print(f"[{label:<8}] {len(chunks):4d} chunks  tokens min {min(tokens):5d} / mean {result['mean_tokens']:7.1f} / "
+          f"max {max(tokens):5d}  fill {result['fill']:.0%}  over budget {over}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=str(ROOT / "GCF_000005845.2_ASM584v2_genomic_input.json"))
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--budget", type=int, default=LLM_PROMPT_TOKENS)
+    args = parser.parse_args()
+
+    with open(args.input, 'r') as f:
+        data = json.load(f)
+    products = data.get("input", data)["products"]
+    count_tokens, tokenizer = get_token_counter()
+    print(f"📋 {len(products)} products, tokenizer {tokenizer}, budget {args.budget} tokens")
+
+    results = {"fixed": summarize("fixed", list(chunk_products(products, args.chunk_size)), count_tokens, args.budget)}
+    stats = {}
+    kept = prepare_products(products, stats=stats)
+    print(f"   정규화 후 {stats['products_kept']} products "
+          f"(중복 {stats['duplicates_dropped']}, 무정보 {stats['uninformative_dropped']} 제거)")
+    results["packed"] = summarize("packed", pack_products(kept, token_budget=args.budget, count_tokens=count_tokens),
+                                  count_tokens, args.budget)
+    results["products"] = stats
+
+    saved = results["fixed"]["chunks"] - results["packed"]["chunks"]
+    print(f"\n🚀 packing: {saved} fewer LLM calls per genome ({saved / results['fixed']['chunks']:.1%})")
+
+    out = Path(__file__).resolve().parent / "results_chunking.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 결과 저장: {out}")
+
+
+if __name__ == "__main__":
+    main()
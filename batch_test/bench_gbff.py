@@ -0,0 +1,93 @@
+"""
+GBFF 파싱 벤치마크: main.gbff_ingest (streaming / 병렬) vs Biopython SeqIO.parse
+각 방식의 처리 시간, MB/s, CDS/s 를 비교하고 추출 결과(locus_tag, product, translation, 좌표)가 같은지 확인
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from main.gbff_ingest import iter_cds, open_gbff, parse_gbff
+
+
+def parse_seqio(path: str):
+    """워크플로 노트북과 같은 방식 (SeqIO.parse 로 레코드 전체 로드)"""
+    from Bio import SeqIO
+
+    cds = []
+    with open_gbff(path) as handle:
+        for record in SeqIO.parse(handle, "genbank"):
+            for feat in record.features:
+                if feat.type != "CDS":
+                    continue
+                q = feat.qualifiers
+                cds.append({
+                    "record": record.id,
+                    "locus_tag": q.get("locus_tag", [""])[0],
+                    "protein_id": q.get("protein_id", [""])[0],
+                    "product": q.get("product", [""])[0],
+                    "translation": q.get("translation", [""])[0],
+                    "start": int(feat.location.start),
+                    "end": int(feat.location.end),
+                    "strand": feat.location.strand or 1,
+                })
+    return cds
+
+
+def timed(label: str, fn, size_mb: float, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"[{label:<14}] {best:.3f}s  {size_mb / best:7.1f} MB/s  {len(result) / best:9.0f} CDS/s  ({len(result)} CDS)")
+    return result, {"seconds": round(best, 4), "mb_per_s": round(size_mb / best, 2),
+                    "cds_per_s": round(len(result) / best, 1), "n_cds": len(result)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("gbff", help="plain 또는 gzipped .gbff 경로")
+    parser.add_argument("--procs", type=int, default=os.cpu_count())
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    size_mb = os.path.getsize(args.gbff) / 1024**2
+    print(f"📋 {args.gbff} ({size_mb:.1f} MB on disk), procs={args.procs}")
+
+    results = {}
+    streamed, results["stream"] = timed("stream", lambda: list(iter_cds(args.gbff)), size_mb, args.repeat)
+    parallel, results["parallel"] = timed(f"parallel x{args.procs}",
+                                          lambda: parse_gbff(args.gbff, num_procs=args.procs), size_mb, args.repeat)
+    assert parallel == streamed, "병렬 파싱 결과가 streaming 결과와 다름"
+
+    try:
+        reference, results["seqio"] = timed("SeqIO.parse", lambda: parse_seqio(args.gbff), size_mb, args.repeat)
+    except ImportError:
+        print("   ✗ Biopython 미설치: SeqIO 비교 생략")
+        reference = None
+
+    if reference is not None:
+        keys = ("record", "locus_tag", "protein_id", "product", "translation", "start", "end", "strand")
+        mismatches = [i for i, (a, b) in enumerate(zip(streamed, reference))
+                      if any(a[k] != b[k] for k in keys)]
+        mismatches += list(range(min(len(streamed), len(reference)), max(len(streamed), len(reference))))
+        print(f"\n🔍 SeqIO 대비 불일치 CDS: {len(mismatches)}" + (f" (첫 index {mismatches[0]})" if mismatches else ""))
+        results["mismatches"] = len(mismatches)
+        for mode in ("stream", "parallel"):
+            results[mode]["speedup_vs_seqio"] = round(results["seqio"]["seconds"] / results[mode]["seconds"], 2)
+            print(f"🚀 {mode}: {results[mode]['speedup_vs_seqio']:.2f}x vs SeqIO.parse")
+
+    out = Path(__file__).resolve().parent / "results_gbff.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 결과 저장: {out}")
+
+
+if __name__ == "__main__":
+    main()
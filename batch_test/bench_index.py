@@ -0,0 +1,112 @@
+"""
+임베딩 유사도 인덱스 벤치마크: ExactIndex vs IVFPQIndex
+10k / 100k / 1M 벡터에서 빌드 시간, 쿼리 지연 시간, recall@k (exact 기준) 비교
+
+--embeddings 로 저장된 *_embeddings.npy 를 주면 실제 임베딩을 (노이즈를 더해) 반복 사용,
+없으면 ESM2-t6 차원(320)의 군집형 합성 벡터를 사용
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from main.embedding_index import ExactIndex, IVFPQIndex, load_saved_embeddings
+
+
+def make_vectors(n: int, dim: int, base: np.ndarray, rng) -> np.ndarray:
+    """base 벡터를 중심으로 노이즈를 더해 n 개 생성 (단백질 family 구조 흉내)"""
+    centers = base[rng.integers(0, len(base), n)]
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * centers.std() * 0.3
+    return centers + noise
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray) -> float:
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+    return hits / exact.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=320)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--rerank", type=int, default=4)
+    parser.add_argument("--embeddings", nargs="*", default=None, help="저장된 *_embeddings.npy 경로")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.embeddings:
+        base, _ = load_saved_embeddings(args.embeddings)
+        print(f"📋 실제 임베딩 {len(base)}개 기반")
+    else:
+        base = rng.standard_normal((5000, args.dim)).astype(np.float32)
+        print(f"📋 합성 군집 벡터 (dim={args.dim}, 5000 centers)")
+    dim = base.shape[1]
+
+    results = []
+    for n in [int(x) for x in args.sizes.split(",")]:
+        print(f"\n▶ N = {n:,}")
+        data = make_vectors(n, dim, base, rng)
+        queries = make_vectors(args.queries, dim, base, rng)
+
+        start = time.perf_counter()
+        exact = ExactIndex(data)
+        exact_build = time.perf_counter() - start
+        start = time.perf_counter()
+        _, exact_rows = exact.search(queries, k=args.k)
+        exact_query = time.perf_counter() - start
+        print(f"   exact : build {exact_build:.2f}s, query {exact_query / args.queries * 1000:.3f} ms/q")
+
+        nlist = max(16, int(4 * np.sqrt(n)))
+        ivf = IVFPQIndex(nlist=nlist, m=args.m, nprobe=args.nprobe)
+        start = time.perf_counter()
+        ivf.train(data)
+        ivf.add(data, keep_vectors=args.rerank > 0)
+        ivf_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, pq_rows = ivf.search(queries, k=args.k)
+        pq_query = time.perf_counter() - start
+        pq_recall = recall_at_k(pq_rows, exact_rows)
+        print(f"   ivfpq : build {ivf_build:.2f}s (nlist={nlist}), query {pq_query / args.queries * 1000:.3f} ms/q, "
+              f"recall@{args.k} {pq_recall:.3f}")
+
+        rr_query, rr_recall = None, None
+        if args.rerank > 0:
+            start = time.perf_counter()
+            _, rr_rows = ivf.search(queries, k=args.k, rerank=args.rerank)
+            rr_query = time.perf_counter() - start
+            rr_recall = recall_at_k(rr_rows, exact_rows)
+            print(f"   +rerank x{args.rerank}: query {rr_query / args.queries * 1000:.3f} ms/q, "
+                  f"recall@{args.k} {rr_recall:.3f}")
+
+        results.append({
+            "n": n,
+            "exact_build_s": round(exact_build, 3),
+            "exact_ms_per_query": round(exact_query / args.queries * 1000, 4),
+            "ivfpq_build_s": round(ivf_build, 3),
+            "ivfpq_ms_per_query": round(pq_query / args.queries * 1000, 4),
+            "ivfpq_recall": round(pq_recall, 4),
+            "rerank_ms_per_query": round(rr_query / args.queries * 1000, 4) if rr_query else None,
+            "rerank_recall": round(rr_recall, 4) if rr_recall is not None else None,
+            "exact_mb": round(exact.vectors.nbytes / 1024**2, 1),
+            "pq_codes_mb": round(ivf.codes.nbytes / 1024**2, 1),
+        })
+        del data, exact, ivf
+
+    out = Path(__file__).resolve().parent / "results_index.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 결과 저장: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+LLM chunk dispatch 벤치마크: collect_tags 의 product chunk 요청을 동시에 몇 개까지 보낼지 (max_inflight) 비교
+실제 Ollama 대신 지연 시간을 설정할 수 있는 로컬 stub 서버 (/api/chat) 를 띄워서 측정
+
+stub 서버는 --server-parallel 개까지만 동시에 처리 (Ollama 의 OLLAMA_NUM_PARALLEL 흉내)
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+
+def make_stub_handler(latency: float, jitter: float, parallel: int, freeform_rate: float = 0.0):
+    """
+    freeform_rate: format(JSON schema) 없이 요청했을 때 JSON 없는 문장으로 답할 확률
+    (format 을 지정하면 항상 JSON 으로 답함)
+    """
+    slots = threading.Semaphore(parallel)
+
+    class StubOllamaHandler(BaseHTTPRequestHandler):
+        """Ollama /api/chat 응답 형식을 흉내내는 stub (stream / non-stream 모두 지원)"""
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = body.get("messages", [{}])[-1].get("content", "")
+            with slots:
+                time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            # 프롬프트 내용에 따라 결정되는 태그 (순서 결정성 확인용)
+            tag = f"capability {abs(hash(prompt)) % 1000}"
+            if not body.get("format") and random.random() < freeform_rate:
+                content = f"Based on the annotations, this genome shows {tag}."
+            else:
+                content = json.dumps({"tags": [tag]})
+
+            def message(text, done):
+                payload = {
+                    "model": body.get("model", "stub"),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": text},
+                    "done": done,
+                }
+                if done:
+                    payload["done_reason"] = "stop"
+                return json.dumps(payload).encode()
+
+            if body.get("stream", True):
+                # Ollama 처럼 NDJSON 으로 조각을 보낸 뒤 done 메시지
+                half = len(content) // 2
+                data = b"\n".join([message(content[:half], False), message(content[half:], False),
+                                   message("", True)]) + b"\n"
+                content_type = "application/x-ndjson"
+            else:
+                data = message(content, True)
+                content_type = "application/json"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return StubOllamaHandler
+
+
+def load_products(path: Path, limit: int):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return data.get("input", data)["products"][:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=str(ROOT / "GCF_000005845.2_ASM584v2_genomic_input.json"))
+    parser.add_argument("--limit", type=int, default=2000, help="사용할 product 수")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub LLM 응답 지연 (초)")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--server-parallel", type=int, default=4)
+    parser.add_argument("--inflight", default="1,2,4,8")
+    parser.add_argument("--port", type=int, default=11500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_stub_handler(args.latency, args.jitter, args.server_parallel))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # ollama 모듈의 기본 client 는 import 시점의 OLLAMA_HOST 를 사용
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{args.port}"
+    from main.generate_tags import tag_products
+
+    products = load_products(Path(args.input), args.limit)
+    n_chunks = (len(products) - 1) // args.chunk_size + 1
+    print(f"📋 {len(products)} products → {n_chunks} chunks, stub latency {args.latency}±{args.jitter}s, "
+          f"server parallel {args.server_parallel}")
+
+    results = {}
+    baseline_tags = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for inflight in [int(x) for x in args.inflight.split(",")]:
+            log = os.path.join(tmp, f"log_{inflight}.txt")
+            start = time.perf_counter()
+            tags, degraded = tag_products(products, log, chunk_size=args.chunk_size, max_inflight=inflight)
+            elapsed = time.perf_counter() - start
+
+            if baseline_tags is None:
+                baseline_tags = tags
+            same_order = tags == baseline_tags
+            results[inflight] = {"seconds": round(elapsed, 3), "chunks_per_s": round(n_chunks / elapsed, 2),
+                                 "same_order_as_serial": same_order, "degraded_chunks": len(degraded)}
+            print(f"[inflight {inflight:>2}] {elapsed:7.2f}s  {n_chunks / elapsed:6.2f} chunks/s  "
+                  f"order {'✓' if same_order else '✗'}")
+    server.shutdown()
+
+    first = next(iter(results.values()))["seconds"]
+    for r in results.values():
+        r["speedup"] = round(first / r["seconds"], 2)
+    print("\n" + "  ".join(f"x{k}: {v['speedup']:.2f}x" for k, v in results.items()))
+
+    out = Path(__file__).resolve().parent / "results_llm_dispatch.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 결과 저장: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+ESM2 추론 정밀도 벤치마크: fp32 vs bf16 vs int8 (CPU)
+각 모드의 처리량(seq/s, tokens/s)과 fp32 기준 cosine similarity 를 비교
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from main.esm_embedding import ESMEmbedder
+
+
+def load_translations(path: Path, limit: int):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    # test_input.json 은 {"input": {...}} 형태, genome input json 은 wrapper 없음
+    translations = data.get("input", data)["translations"]
+    return [t for t in translations if t][:limit]
+
+
+def run_mode(dtype: str, sequences, device: str, batch_size: int, max_tokens: int):
+    embedder = ESMEmbedder(device=device, dtype=dtype)
+    # warm-up (첫 배치의 커널 초기화 비용 제외)
+    embedder.encode_batch(sequences[:batch_size], batch_size=batch_size, show_progress=False)
+
+    start = time.perf_counter()
+    embeddings = embedder.encode_batch(sequences, batch_size=batch_size, max_tokens=max_tokens,
+                                       show_progress=False)
+    elapsed = time.perf_counter() - start
+
+    matrix = np.vstack([e for e in embeddings if e is not None]).astype(np.float32)
+    del embedder
+    return matrix, elapsed
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=str(ROOT / "GCF_000005845.2_ASM584v2_genomic_input.json"))
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--modes", default="fp32,bf16,int8")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-tokens", type=int, default=16384)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    sequences = load_translations(Path(args.input), args.limit)
+    n_tokens = sum(min(len(s), 1022) + 2 for s in sequences)
+    print(f"📋 {len(sequences)} sequences, {n_tokens:,} tokens, device={args.device}, "
+          f"threads={torch.get_num_threads()}")
+
+    modes = [m.strip() for m in args.modes.split(",")]
+    if "fp32" not in modes:
+        modes.insert(0, "fp32")
+
+    results = {}
+    baseline = None
+    for mode in modes:
+        print(f"\n▶ {mode} ...")
+        try:
+            matrix, elapsed = run_mode(mode, sequences, args.device, args.batch_size, args.max_tokens)
+        except Exception as e:
+            print(f"   ✗ {mode} 실패: {e}")
+            continue
+        if mode == "fp32":
+            baseline = matrix
+        cos = cosine_rows(matrix, baseline)
+        results[mode] = {
+            "seconds": round(elapsed, 3),
+            "seq_per_s": round(len(sequences) / elapsed, 2),
+            "tokens_per_s": round(n_tokens / elapsed, 1),
+            "speedup_vs_fp32": None,
+            "cosine_mean": float(cos.mean()),
+            "cosine_min": float(cos.min()),
+        }
+
+    for mode, r in results.items():
+        r["speedup_vs_fp32"] = round(results["fp32"]["seconds"] / r["seconds"], 2)
+
+    print("\n" + "=" * 80)
+    print(f"{'mode':<6} {'time(s)':>9} {'seq/s':>9} {'tok/s':>11} {'speedup':>8} {'cos mean':>10} {'cos min':>10}")
+    print("-" * 80)
+    for mode, r in results.items():
+        print(f"{mode:<6} {r['seconds']:>9.2f} {r['seq_per_s']:>9.1f} {r['tokens_per_s']:>11.0f} "
+              f"{r['speedup_vs_fp32']:>7.2f}x {r['cosine_mean']:>10.5f} {r['cosine_min']:>10.5f}")
+    print("=" * 80)
+
+    out = Path(__file__).resolve().parent / "results_precision.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 결과 저장: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+서열 전처리 마이크로벤치마크
+기존 경로 (서열마다 set + generator 정제, HuggingFace tokenizer 문자열 단위 호출) vs
+fast path (clean_sequences 일괄 정제 + FastTokenizer 패딩 정수 배열)
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+from transformers import AutoTokenizer
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from main.esm_embedding import DEFAULT_MODEL, FastTokenizer, clean_sequences
+
+
+def legacy_clean(sequence: str) -> str:
+    """기존 ESMEmbedder.clean_sequence 구현"""
+    valid_aa = set('ACDEFGHIKLMNPQRSTVWY*')
+    return ''.join(c for c in sequence.upper() if c in valid_aa)
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=str(ROOT / "GCF_000005845.2_ASM584v2_genomic_input.json"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-length", type=int, default=1024)
+    args = parser.parse_args()
+
+    with open(args.input, 'r') as f:
+        data = json.load(f)
+    # test_input.json 은 {"input": {...}} 형태, genome input json 은 wrapper 없음
+    translations = data.get("input", data)["translations"]
+    print(f"📋 {len(translations)} translations, {sum(len(t or '') for t in translations):,} residues")
+
+    tokenizer = AutoTokenizer.from_pretrained(DEFAULT_MODEL)
+    fast = FastTokenizer.from_hf(tokenizer)
+    if fast is None:
+        print("✗ FastTokenizer 사용 불가 (vocabulary 불일치)")
+        return
+
+    # 1. 정제
+    t_clean_old, cleaned_old = timed(lambda: [legacy_clean(t) if t else '' for t in translations], args.repeat)
+    t_clean_new, cleaned_new = timed(lambda: clean_sequences(translations), args.repeat)
+    assert cleaned_old == cleaned_new, "정제 결과 불일치"
+
+    # 2. 토큰화 (빈 서열 제외)
+    cleaned = [s for s in cleaned_new if s]
+    t_tok_old, old_ids = timed(
+        lambda: [tokenizer(s[:args.max_length], truncation=True, max_length=args.max_length)["input_ids"]
+                 for s in cleaned],
+        args.repeat
+    )
+    t_tok_new, (ids, mask) = timed(lambda: fast(cleaned, max_length=args.max_length), args.repeat)
+
+    # 정합성: 패딩 제외 토큰이 HuggingFace 결과와 동일한지 확인
+    mismatches = sum(1 for row, ref in enumerate(old_ids) if ids[row, :mask[row].sum()].tolist() != ref)
+
+    print("\n" + "=" * 60)
+    print(f"{'stage':<12} {'legacy(ms)':>12} {'fast(ms)':>12} {'speedup':>10}")
+    print("-" * 60)
+    for stage, old, new in (("clean", t_clean_old, t_clean_new), ("tokenize", t_tok_old, t_tok_new),
+                            ("total", t_clean_old + t_tok_old, t_clean_new + t_tok_new)):
+        print(f"{stage:<12} {old * 1000:>12.1f} {new * 1000:>12.1f} {old / new:>9.1f}x")
+    print("=" * 60)
+    print(f"토큰 불일치: {mismatches}/{len(cleaned)}, padded array: {ids.shape} {ids.dtype}, "
+          f"padding {1 - mask.sum() / mask.size:.1%}")
+
+
+if __name__ == "__main__":
+    main()
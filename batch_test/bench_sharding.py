@@ -0,0 +1,79 @@
+"""
+CPU 멀티프로세스 샤딩 임베딩 스케일링 벤치마크
+E. coli translation 세트를 1 ~ N 개 프로세스로 임베딩하여 처리 시간/속도 향상/효율 비교
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from main.esm_embedding import get_embedder, encode_sharded, shutdown_shard_pool
+
+
+def load_translations(path: Path, limit: int):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    # test_input.json 은 {"input": {...}} 형태, genome input json 은 wrapper 없음
+    translations = data.get("input", data)["translations"]
+    return translations[:limit] if limit else translations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=str(ROOT / "GCF_000005845.2_ASM584v2_genomic_input.json"))
+    parser.add_argument("--limit", type=int, default=0, help="0: 전체 translation 사용")
+    parser.add_argument("--max-procs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dtype", default="fp32")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-tokens", type=int, default=16384)
+    args = parser.parse_args()
+
+    sequences = load_translations(Path(args.input), args.limit)
+    cores = os.cpu_count() or 1
+    print(f"📋 {len(sequences)} sequences, {cores} cores, dtype={args.dtype}")
+
+    proc_counts = sorted({1, 2, 4, 8, 16, args.max_procs} & set(range(1, args.max_procs + 1)))
+    results = []
+    for n in proc_counts:
+        print(f"\n▶ {n} process(es), {max(1, cores // n)} threads each")
+        if n == 1:
+            import torch
+            torch.set_num_threads(cores)
+            embedder = get_embedder(dtype=args.dtype, device="cpu")
+            embedder.encode_batch(sequences[:64], show_progress=False)
+            start = time.perf_counter()
+            embedder.encode_batch(sequences, batch_size=args.batch_size, max_tokens=args.max_tokens,
+                                  show_progress=False)
+        else:
+            # warm-up: 프로세스 생성 + 모델 로드 시간 제외
+            encode_sharded(sequences[:64 * n], n, dtype=args.dtype)
+            start = time.perf_counter()
+            encode_sharded(sequences, n, dtype=args.dtype, batch_size=args.batch_size, max_tokens=args.max_tokens)
+        elapsed = time.perf_counter() - start
+        results.append({"procs": n, "seconds": round(elapsed, 2), "seq_per_s": round(len(sequences) / elapsed, 1)})
+        print(f"   ✅ {elapsed:.2f}초 ({len(sequences) / elapsed:.1f} seq/s)")
+
+    shutdown_shard_pool()
+
+    base = results[0]["seconds"]
+    print("\n" + "=" * 60)
+    print(f"{'procs':>6} {'time(s)':>10} {'seq/s':>10} {'speedup':>9} {'efficiency':>11}")
+    print("-" * 60)
+    for r in results:
+        r["speedup"] = round(base / r["seconds"], 2)
+        r["efficiency"] = round(r["speedup"] / r["procs"], 2)
+        print(f"{r['procs']:>6} {r['seconds']:>10.2f} {r['seq_per_s']:>10.1f} {r['speedup']:>8.2f}x {r['efficiency']:>10.0%}")
+    print("=" * 60)
+
+    out = Path(__file__).resolve().parent / "results_sharding.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 결과 저장: {out}")
+
+
+if __name__ == "__main__":
+    main()
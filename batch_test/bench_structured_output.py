@@ -0,0 +1,85 @@
+"""
+Structured output 벤치마크: Ollama `format` JSON schema 사용 여부에 따른 genome 당 LLM 호출 수 비교
+free-form 모드에서는 JSON 이 아닌 답변마다 parse 실패 → 재시도 호출이 추가로 발생
+
+기본은 실제 Ollama 서버 (OLLAMA_HOST) 를 사용하고, --stub 을 주면 bench_llm_dispatch 의 stub 서버를
+(--freeform-rate 확률로 JSON 없는 답변을 내도록) 띄워서 측정
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+
+def load_products(path: Path, limit: int):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return data.get("input", data)["products"][:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=str(ROOT / "GCF_000005845.2_ASM584v2_genomic_input.json"))
+    parser.add_argument("--limit", type=int, default=None, help="사용할 product 수 (기본: 전체 genome)")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--inflight", type=int, default=4)
+    parser.add_argument("--stub", action="store_true", help="실제 Ollama 대신 로컬 stub 서버 사용")
+    parser.add_argument("--freeform-rate", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=11501)
+    args = parser.parse_args()
+
+    server = None
+    if args.stub:
+        from bench_llm_dispatch import make_stub_handler
+        server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                     make_stub_handler(args.latency, 0.0, args.inflight, args.freeform_rate))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{args.port}"
+    from main.generate_tags import LLMUsage, RetryPolicy, tag_products
+
+    products = load_products(Path(args.input), args.limit)
+    n_chunks = (len(products) - 1) // args.chunk_size + 1
+    print(f"📋 {len(products)} products → {n_chunks} chunks "
+          f"({'stub, free-form rate ' + str(args.freeform_rate) if args.stub else os.environ.get('OLLAMA_HOST', 'local Ollama')})")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for structured in (False, True):
+            mode = "structured" if structured else "freeform"
+            usage = LLMUsage(structured=structured)
+            # 이 벤치마크에서는 breaker / job budget 없이 호출 수만 비교
+            policy = RetryPolicy(max_attempts=10, base_delay=0.0, max_delay=0.0)
+            start = time.perf_counter()
+            tags, degraded = tag_products(products, os.path.join(tmp, f"{mode}.txt"), chunk_size=args.chunk_size,
+                                          max_inflight=args.inflight, policy=policy, usage=usage)
+            elapsed = time.perf_counter() - start
+            results[mode] = dict(usage.stats(), seconds=round(elapsed, 3), tags=len(tags),
+                                 degraded_chunks=len(degraded), calls_per_chunk=round(usage.calls / n_chunks, 3))
+            print(f"[{mode:<10}] {usage.calls} calls ({usage.parse_failures} parse failures), "
+                  f"{usage.calls / n_chunks:.2f} calls/chunk, {elapsed:.1f}s")
+    if server is not None:
+        server.shutdown()
+
+    saved = results["freeform"]["calls"] - results["structured"]["calls"]
+    results["calls_saved_per_genome"] = saved
+    print(f"\n🚀 structured output: {saved} LLM calls saved per genome "
+          f"({saved / max(results['freeform']['calls'], 1):.1%})")
+
+    out = Path(__file__).resolve().parent / "results_structured_output.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 결과 저장: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+llm_cache=False 작업이 job cache 를 우회하는지 확인
+같은 입력의 llm_cache=False 작업을 연속으로 2번 실행하면 두 번 모두 collect_tags 까지 도달해야 함
+(llm_cache=True 작업은 두 번째 실행이 job cache hit)
+
+collect_tags / embed_sequences 는 stub 으로 대체하므로 모델/Ollama 없이 실행 가능
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        # rp_handler 는 import 시점의 환경 변수로 cache / store 위치를 정함
+        os.environ["JOB_CACHE_DIR"] = os.path.join(tmp, "job_cache")
+        os.environ["RESULT_STORE"] = os.path.join(tmp, "results")
+        import numpy as np
+        import rp_handler
+
+        calls = []
+
+        def fake_collect_tags(file_name, products, *args, **kwargs):
+            calls.append(kwargs.get("use_llm_cache"))
+            return [f"tag {len(calls)}"]
+
+        def fake_embed_sequences(file_name, translations, *args, **kwargs):
+            return [np.zeros(4, dtype=np.float32) for _ in translations]
+
+        rp_handler.collect_tags = fake_collect_tags
+        rp_handler.embed_sequences = fake_embed_sequences
+
+        def run(llm_cache):
+            event = {"input": {"file_name": "bypass_check.json", "organism": "Escherichia coli",
+                               "products": ["DNA gyrase subunit A"], "translations": ["MKV"],
+                               "llm_cache": llm_cache}}
+            response = rp_handler.run_job(event)
+            assert response["status"] == "success", response
+            return response
+
+        for _ in range(2):
+            response = run(llm_cache=False)
+            assert "cache" not in response, f"llm_cache=False 작업이 job cache 를 사용함: {response['cache']}"
+        assert calls == [False, False], f"llm_cache=False 작업 2개 중 collect_tags 호출: {len(calls)}"
+        print("✓ llm_cache=False: 두 작업 모두 collect_tags 실행, job cache 미사용")
+
+        run(llm_cache=True)
+        second = run(llm_cache=True)
+        assert second.get("cache", {}).get("hit"), "llm_cache=True 두 번째 작업이 job cache hit 가 아님"
+        assert calls == [False, False, True], calls
+        print("✓ llm_cache=True: 두 번째 작업은 job cache hit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+워커 동시성 부하 테스트 (로컬 시뮬레이션, mock_server.py 와 같은 방식)
+rp_handler 의 실제 async_handler / concurrency_modifier / run_job (Stage, ResourceGate 연결) 을 사용하고,
+태그 단계 (collect_tags, LLM 대기) 와 임베딩 단계 (embed_sequences, 임베더 점유) 만 sleep stub 으로 대체해
+sync (작업 1개씩) vs async handler + concurrency_modifier 의 처리량을 비교
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+
+def load_handler(args, tmp: str):
+    """gate 크기 / cache 위치는 rp_handler import 시점의 환경 변수로 정해짐"""
+    os.environ["EMBED_SLOTS"] = str(args.embed_slots)
+    os.environ["OLLAMA_NUM_PARALLEL"] = str(args.llm_slots)
+    os.environ["MAX_CONCURRENCY"] = str(args.max_concurrency)
+    os.environ["RESULT_STORE"] = os.path.join(tmp, "results")
+    os.environ["JOB_CACHE_DIR"] = os.path.join(tmp, "job_cache")
+    import numpy as np
+    import rp_handler
+
+    def fake_collect_tags(file_name, products, *a, **kwargs):
+        # 실제 chat_tags 처럼 LLM 요청 동안만 LLM_GATE slot 을 점유
+        with rp_handler.LLM_GATE.slot():
+            time.sleep(args.llm_time * random.uniform(0.8, 1.2))
+        return ["tag"]
+
+    def fake_embed_sequences(file_name, translations, *a, **kwargs):
+        time.sleep(args.embed_time * random.uniform(0.8, 1.2))
+        return [np.zeros(4, dtype=np.float32) for _ in translations]
+
+    rp_handler.collect_tags = fake_collect_tags
+    rp_handler.embed_sequences = fake_embed_sequences
+    return rp_handler
+
+
+async def run_worker(rp_handler, events, use_modifier: bool):
+    """RunPod job loop 흉내: 0.05초마다 concurrency_modifier 로 동시성을 다시 계산해 큐에서 작업을 꺼냄"""
+    queue = list(events)
+    tasks = set()
+    results = []
+    concurrency = 1
+    peak = 0
+    while queue or tasks:
+        if use_modifier:
+            concurrency = rp_handler.concurrency_modifier(concurrency)
+        while queue and len(tasks) < concurrency:
+            tasks.add(asyncio.create_task(rp_handler.async_handler(queue.pop(0))))
+        await asyncio.sleep(0)
+        peak = max(peak, rp_handler.running_jobs)
+        done, tasks = await asyncio.wait(tasks, timeout=0.05, return_when=asyncio.FIRST_COMPLETED)
+        results.extend(task.result() for task in done)
+    return results, peak
+
+
+def run_mode(label: str, use_modifier: bool, rp_handler, args):
+    # use_cache=False: 같은 입력이 job cache 에 걸리지 않도록
+    events = [{"input": {"file_name": f"genome_{i}.json", "organism": "Escherichia coli",
+                         "products": ["DNA gyrase subunit A"], "translations": ["MKV"], "use_cache": False}}
+              for i in range(args.jobs)]
+    start = time.perf_counter()
+    results, peak = asyncio.run(run_worker(rp_handler, events, use_modifier))
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if r.get("status") != "success"]
+    assert not failed, f"실패한 작업: {failed[0]}"
+    mean_job = sum(r["timings"]["total"] for r in results) / len(results)
+    print(f"[{label:<5}] {len(results)} jobs in {elapsed:.2f}s → {len(results) / elapsed:.2f} jobs/s "
+          f"(mean job {mean_job:.2f}s, peak concurrency {peak})")
+    return {"seconds": round(elapsed, 3), "jobs_per_s": round(len(results) / elapsed, 3),
+            "mean_job_s": round(mean_job, 3), "peak_concurrency": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--llm-time", type=float, default=2.0, help="작업당 태그 단계 시간 (Ollama 대기)")
+    parser.add_argument("--embed-time", type=float, default=0.5, help="작업당 임베딩 단계 시간 (임베더 점유)")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--embed-slots", type=int, default=1)
+    parser.add_argument("--llm-slots", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"📋 {args.jobs} jobs, LLM {args.llm_time}s (slots {args.llm_slots}), "
+          f"embed {args.embed_time}s (slots {args.embed_slots}), max concurrency {args.max_concurrency}")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        rp_handler = load_handler(args, tmp)
+        # 작업별 출력 디렉토리 (temp/<job_hash>/) 도 임시 디렉토리 안에 생성
+        os.chdir(tmp)
+        try:
+            results = {"sync": run_mode("sync", False, rp_handler, args),
+                       "async": run_mode("async", True, rp_handler, args)}
+        finally:
+            os.chdir(cwd)
+    results["speedup"] = round(results["sync"]["seconds"] / results["async"]["seconds"], 2)
+    print(f"\n🚀 async + concurrency_modifier: {results['speedup']:.2f}x throughput")
+
+    out = Path(__file__).resolve().parent / "results_concurrency.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 결과 저장: {out}")
+
+
+if __name__ == "__main__":
+    main()
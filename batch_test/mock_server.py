@@ -32,8 +32,21 @@ def process_job_async(job_id: str, input_data: dict):
         jobs[job_id]["status"] = "IN_PROGRESS"
         jobs[job_id]["started_at"] = datetime.now().isoformat()
     
-    # 실제 작업 시뮬레이션 (대기)
-    time.sleep(wait_time)
+    # 실제 작업 시뮬레이션: 기본은 실제 handler 기본값 (STREAM_RESULTS=0) 처럼 최종 결과 dict 만 반환
+    # stream_updates > 0 이면 generator handler (STREAM_RESULTS=1) 처럼 중간 결과를 stream 에 쌓으면서 대기
+    num_updates = int(input_data.get("stream_updates", 0))
+    for i in range(num_updates):
+        time.sleep(wait_time / max(num_updates, 1))
+        if i % 2 == 0:
+            update = {"type": "tags_chunk", "chunk": i // 2 + 1, "n_chunks": (num_updates + 1) // 2,
+                      "tags": [f"mock tag {i // 2 + 1}"]}
+        else:
+            update = {"type": "embedding_batch", "indices": [i // 2], "done": i // 2 + 1,
+                      "total": num_updates // 2}
+        with job_lock:
+            jobs[job_id]["stream"].append(update)
+    if num_updates == 0:
+        time.sleep(wait_time)
     
     # 결과 생성
     result_text = f"""작업 완료 보고서
@@ -49,12 +62,18 @@ Job ID: {job_id}
     with job_lock:
         jobs[job_id]["status"] = "COMPLETED"
         jobs[job_id]["completed_at"] = datetime.now().isoformat()
-        jobs[job_id]["output"] = {
+        result = {
             "result_text": result_text,
             "wait_time": wait_time,
             "input_data": input_data
         }
         jobs[job_id]["executionTime"] = int(wait_time * 1000)  # 밀리초
+        if num_updates > 0:
+            # generator handler + return_aggregate_stream: /status output 은 yield 된 모든 결과의 list
+            jobs[job_id]["stream"].append(dict(result, type="result"))
+            jobs[job_id]["output"] = list(jobs[job_id]["stream"])
+        else:
+            jobs[job_id]["output"] = result
 
 
 @app.route('/v2/<endpoint_id>/run', methods=['POST'])
@@ -73,7 +92,9 @@ def submit_job(endpoint_id):
                 "id": job_id,
                 "status": "IN_QUEUE",
                 "input": input_data,
-                "created_at": datetime.now().isoformat()
+                "created_at": datetime.now().isoformat(),
+                "stream": [],        # generator handler 가 yield 한 중간 결과
+                "stream_cursor": 0   # /stream 으로 이미 전달한 개수
             }
         
         # 백그라운드에서 작업 처리 시작
@@ -99,7 +120,26 @@ def get_status(endpoint_id, job_id):
     if not job:
         return jsonify({"error": "Job not found"}), 404
     
-    return jsonify(job)
+    return jsonify({k: v for k, v in job.items() if k not in ("stream", "stream_cursor")})
+
+
+@app.route('/v2/<endpoint_id>/stream/<job_id>', methods=['GET'])
+def stream_job(endpoint_id, job_id):
+    """스트림 조회 엔드포인트: 지난 호출 이후 새로 yield 된 결과만 반환 (RunPod /stream 과 같은 형식)"""
+    with job_lock:
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        
+        new_items = job["stream"][job["stream_cursor"]:]
+        job["stream_cursor"] = len(job["stream"])
+        status = job["status"]
+    
+    return jsonify({
+        "id": job_id,
+        "status": status,
+        "stream": [{"output": item} for item in new_items]
+    })
 
 
 @app.route('/v2/<endpoint_id>/cancel/<job_id>', methods=['POST'])
@@ -150,6 +190,7 @@ if __name__ == '__main__':
     print("\n사용 가능한 엔드포인트:")
     print("  POST   /v2/<endpoint_id>/run           - 작업 제출")
     print("  GET    /v2/<endpoint_id>/status/<id>   - 상태 조회")
+    print("  GET    /v2/<endpoint_id>/stream/<id>   - 중간 결과 스트림 (input 에 stream_updates > 0 일 때)")
     print("  POST   /v2/<endpoint_id>/cancel/<id>   - 작업 취소")
     print("  GET    /health                          - 헬스 체크")
     print("  GET    /jobs                            - 모든 작업 목록")
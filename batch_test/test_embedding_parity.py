@@ -0,0 +1,48 @@
+"""
+ESM2 배치 임베딩 정합성 테스트
+encode_batch (padded mini-batch) 결과가 encode_single (서열 단위) 결과와 일치하는지 확인
+"""
+import sys
+import json
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from main.esm_embedding import ESMEmbedder
+
+
+INPUT_JSON = Path(__file__).resolve().parent.parent / "test_input.json"
+
+
+def load_translations(limit: int = 24):
+    """test_input.json 에서 길이가 다양한 서열 + 빈 서열 준비"""
+    with open(INPUT_JSON, 'r') as f:
+        translations = json.load(f)["input"]["translations"][:limit]
+    # 빈 문자열 / None 슬롯도 그대로 유지되는지 확인
+    return translations + ["", "   "]
+
+
+def test_batch_matches_single(atol: float = 1e-4):
+    embedder = ESMEmbedder(device="cpu")
+    sequences = load_translations()
+
+    batched = embedder.encode_batch(sequences, batch_size=8, show_progress=False)
+    assert len(batched) == len(sequences)
+
+    for seq, emb in zip(sequences, batched):
+        clean_seq = embedder.clean_sequence(seq) if seq and seq.strip() else ""
+        if not clean_seq:
+            assert emb is None
+            continue
+
+        single = embedder.encode_single(clean_seq)
+        assert emb.shape == single.shape
+        max_diff = float(np.abs(emb - single).max())
+        assert np.allclose(emb, single, atol=atol), f"length {len(clean_seq)}: max diff {max_diff:.2e}"
+
+    print(f"✅ {sum(e is not None for e in batched)} embeddings match per-sequence output (atol={atol})")
+
+
+if __name__ == "__main__":
+    test_batch_matches_single()
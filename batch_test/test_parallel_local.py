@@ -13,10 +13,15 @@ from datetime import datetime
 class LocalMockProcessor:
     """로컬 Mock 서버를 사용한 병렬 처리 테스트"""
     
-    def __init__(self, base_url: str = "http://localhost:5000", num_workers: int = 5):
+    def __init__(self, base_url: str = "http://localhost:5000", num_workers: int = 5, use_stream: bool = False,
+                 stream_updates: int = 4):
         self.base_url = base_url
         self.num_workers = num_workers
         self.endpoint_id = "test-endpoint"
+        # False (기본, 실제 handler 기본값과 같음): /status polling
+        # True: STREAM_RESULTS=1 worker 처럼 mock 이 stream_updates 개의 중간 결과를 쌓고 /stream 으로 수신
+        self.use_stream = use_stream
+        self.stream_updates = stream_updates
     
     async def submit_job(self, session: aiohttp.ClientSession, input_data: Dict) -> str:
         """작업 제출"""
@@ -39,6 +44,10 @@ class LocalMockProcessor:
             status = await self.check_status(session, job_id)
             
             if status.get("status") == "COMPLETED":
+                output = status.get("output")
+                if isinstance(output, list):
+                    # streaming handler: /status 는 yield 된 결과 list, 마지막 'result' 항목이 최종 응답
+                    status["output"] = next((u for u in reversed(output) if u.get("type") == "result"), {})
                 return status
             elif status.get("status") in ["FAILED", "CANCELLED"]:
                 raise Exception(f"Job {job_id} failed: {status}")
@@ -47,17 +56,52 @@ class LocalMockProcessor:
         
         raise TimeoutError(f"Job {job_id} timed out after {max_wait} seconds")
     
+    async def consume_stream(self, session: aiohttp.ClientSession, job_id: str, job_index: int = 0,
+                             max_wait: int = 300, poll_interval: float = 0.5) -> Dict:
+        """generator handler 의 중간 결과(tag chunk, embedding batch)를 받아 처리하고 최종 결과 반환"""
+        url = f"{self.base_url}/v2/{self.endpoint_id}/stream/{job_id}"
+        start_time = time.time()
+        final = None
+        while time.time() - start_time < max_wait:
+            async with session.get(url) as response:
+                payload = await response.json()
+            
+            for item in payload.get("stream", []):
+                update = item.get("output", {})
+                if update.get("type") == "tags_chunk":
+                    print(f"[Worker {job_index+1:2d}]   🏷  tag chunk {update['chunk']}/{update['n_chunks']}: "
+                          f"{len(update.get('tags', []))} tags")
+                elif update.get("type") == "embedding_batch":
+                    print(f"[Worker {job_index+1:2d}]   🧬 embeddings {update['done']}/{update['total']}")
+                elif update.get("type") == "result":
+                    final = update
+            
+            status = payload.get("status")
+            if status == "COMPLETED":
+                return {"status": status, "output": final}
+            elif status in ["FAILED", "CANCELLED"]:
+                raise Exception(f"Job {job_id} failed: {payload}")
+            
+            await asyncio.sleep(poll_interval)
+        
+        raise TimeoutError(f"Job {job_id} timed out after {max_wait} seconds")
+    
     async def process_single_job(self, session: aiohttp.ClientSession, 
                                  input_data: Dict, job_index: int) -> Dict:
         """단일 작업 처리"""
         print(f"[Worker {job_index+1:2d}] 작업 제출 중...")
         
         submit_time = time.time()
+        if self.use_stream:
+            input_data = {"stream_updates": self.stream_updates, **input_data}
         job_id = await self.submit_job(session, input_data)
         
         print(f"[Worker {job_index+1:2d}] Job ID: {job_id[:8]}... - 대기 중...")
         
-        result = await self.wait_for_completion(session, job_id)
+        if self.use_stream:
+            result = await self.consume_stream(session, job_id, job_index)
+        else:
+            result = await self.wait_for_completion(session, job_id)
         complete_time = time.time()
         
         elapsed = complete_time - submit_time
@@ -216,10 +260,10 @@ async def test_parallel_performance():
     }
 
 
-async def simple_test():
-    """간단한 테스트 (5개 작업만)"""
+async def simple_test(use_stream: bool = False):
+    """간단한 테스트 (5개 작업만); use_stream: streaming handler 경로 (/stream) 로 테스트"""
     print("\n" + "=" * 70)
-    print("🎯 간단한 병렬 처리 테스트")
+    print(f"🎯 간단한 병렬 처리 테스트{' (streaming)' if use_stream else ''}")
     print("=" * 70)
     
     import random
@@ -230,7 +274,7 @@ async def simple_test():
         for i in range(5)
     ]
     
-    processor = LocalMockProcessor(num_workers=5)
+    processor = LocalMockProcessor(num_workers=5, use_stream=use_stream)
     
     print("\n5개 작업을 동시에 처리합니다...\n")
     
@@ -261,11 +305,14 @@ if __name__ == "__main__":
 테스트 옵션:
   1. 간단한 테스트 (5개 작업)
   2. 전체 성능 비교 테스트 (10개 작업, 순차 vs 병렬)
+  3. 간단한 테스트, streaming handler 경로 (STREAM_RESULTS=1 worker 흉내)
 """)
     
-    choice = input("선택하세요 (1 또는 2, 기본값 1): ").strip() or "1"
+    choice = input("선택하세요 (1, 2 또는 3, 기본값 1): ").strip() or "1"
     
     if choice == "2":
         asyncio.run(test_parallel_performance())
+    elif choice == "3":
+        asyncio.run(simple_test(use_stream=True))
     else:
         asyncio.run(simple_test())
@@ -0,0 +1,119 @@
+############################################
+## Embedding Cache Module
+## Content-addressed, size-bounded on-disk cache of sequence embeddings
+## Key: sha256(cleaned sequence, model_name, max_length, pooling)
+## Value: raw float32 bytes (SQLite blob)
+############################################
+
+import hashlib
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from main.sqlite_lru import SqliteLRU
+
+
+class EmbeddingCache(SqliteLRU):
+    """SQLite backed LRU cache of per-sequence embeddings"""
+
+    db_file = "embeddings.sqlite"
+    table = "embeddings"
+    columns = ("key TEXT PRIMARY KEY", "dim INTEGER NOT NULL", "data BLOB NOT NULL", "nbytes INTEGER NOT NULL",
+               "last_access REAL NOT NULL")
+    index_name = "idx_last_access"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024**3):
+        """
+        Open (or create) the cache database
+
+        Args:
+            cache_dir: directory holding embeddings.sqlite
+            max_bytes: total payload size before least-recently-used entries are evicted
+        """
+        super().__init__(cache_dir, max_bytes)
+
+    @staticmethod
+    def make_key(sequence: str, model_name: str, max_length: int, pooling: str = "mean") -> str:
+        """
+        Content address of one embedding
+
+        Args:
+            sequence: cleaned protein sequence
+            model_name: HuggingFace model name
+            max_length: truncation length used for encoding
+            pooling: pooling name
+
+        Returns:
+            hex sha256 digest
+        """
+        h = hashlib.sha256()
+        for part in (model_name, str(max_length), pooling, sequence):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up several keys at once, refreshing their LRU position
+
+        Args:
+            keys: cache keys
+
+        Returns:
+            dict of key -> [dim] float32 array for every hit
+        """
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite limits bound parameters per statement
+            for i in range(0, len(unique), 500):
+                part = unique[i:i+500]
+                rows = self._conn.execute(
+                    f"SELECT key, data FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, data in rows:
+                    found[key] = np.frombuffer(data, dtype=np.float32).copy()
+
+            if found:
+                self._touch(list(found))
+
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Single-key lookup"""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """
+        Store embeddings and evict least-recently-used entries beyond max_bytes
+
+        Args:
+            items: dict of key -> embedding array (flattened to float32)
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, emb in items.items():
+            data = np.ascontiguousarray(emb, dtype=np.float32).reshape(-1)
+            rows.append((key, data.shape[0], data.tobytes(), data.nbytes, now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, data, nbytes, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._evict()
+
+    def put(self, key: str, emb: np.ndarray):
+        """Single-key store"""
+        self.put_many({key: emb})
+
+
+def open_cache(cache_dir: str, max_bytes: int = 2 * 1024**3) -> EmbeddingCache:
+    """Return the process-wide EmbeddingCache for cache_dir (stats accumulate across jobs)"""
+    return EmbeddingCache.open_shared(cache_dir, max_bytes=max_bytes)
@@ -0,0 +1,140 @@
+############################################
+## Embedding Checkpoint Module
+## Append-only on-disk log of finished embedding batches so a restarted job resumes
+## rows.f32      raw float32 rows, appended batch by batch
+## batches.jsonl one line per batch: original indices, row offset, row count
+## meta.json     fingerprint of the job inputs (stale checkpoints are discarded)
+############################################
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def checkpoint_dir(file_name: str, output_path: str, fingerprint: str) -> str:
+    """
+    Checkpoint directory of one genome's embedding job
+
+    Keyed by the input fingerprint as well as the file name, so concurrent jobs for the same
+    file name with different sequences do not discard or delete each other's checkpoint.
+    """
+    return output_path + f"{Path(file_name).stem}-{fingerprint[:12]}_embeddings.partial"
+
+
+def remove_checkpoint(path: str):
+    """Delete a checkpoint directory once the final output is written"""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class EmbeddingCheckpoint:
+    """Append-only log of (indices, embedding rows) batches"""
+
+    def __init__(self, path: str, fingerprint: str):
+        """
+        Open the checkpoint at path, discarding it if it belongs to different inputs
+
+        Args:
+            path: checkpoint directory
+            fingerprint: job fingerprint (see EmbeddingCheckpoint.fingerprint)
+        """
+        self.path = Path(path)
+        self.data_path = self.path / 'rows.f32'
+        self.log_path = self.path / 'batches.jsonl'
+        self.meta_path = self.path / 'meta.json'
+
+        if self.meta_path.exists():
+            try:
+                with open(self.meta_path, 'r') as f:
+                    stale = json.load(f).get('fingerprint') != fingerprint
+            except (OSError, ValueError):
+                stale = True
+            if stale:
+                print(f"Discarding stale embedding checkpoint at {self.path}")
+                remove_checkpoint(str(self.path))
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        if not self.meta_path.exists():
+            with open(self.meta_path, 'w') as f:
+                json.dump({'fingerprint': fingerprint}, f)
+
+    @staticmethod
+    def fingerprint(sequences: List[Optional[str]], model_id: str, max_length: int, long_mode: bool) -> str:
+        """Hash of everything that determines the embedding rows of a job"""
+        h = hashlib.sha256()
+        h.update(f"{model_id}\0{max_length}\0{long_mode}\0{len(sequences)}\0".encode())
+        for seq in sequences:
+            h.update((seq or '').encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def load(self) -> Tuple[List[int], Optional[np.ndarray]]:
+        """
+        Read every complete batch, dropping a torn trailing write
+
+        Returns:
+            (original indices, float32 matrix [len(indices), dim]) or ([], None) if empty
+        """
+        if not self.data_path.exists():
+            return [], None
+
+        data_size = self.data_path.stat().st_size
+        entries = []
+        with open(self.log_path, 'a+') as f:
+            f.seek(0)
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                end = (entry['offset'] + entry['rows']) * entry['dim'] * 4
+                if end > data_size:
+                    break
+                entries.append(entry)
+
+        # truncate anything written after the last complete batch
+        last = entries[-1] if entries else None
+        valid_size = (last['offset'] + last['rows']) * last['dim'] * 4 if last else 0
+        if valid_size < data_size:
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(valid_size)
+        with open(self.log_path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+
+        if not entries:
+            return [], None
+
+        dim = last['dim']
+        matrix = np.fromfile(self.data_path, dtype=np.float32).reshape(-1, dim)
+        indices = [idx for entry in entries for idx in entry['indices']]
+        return indices, matrix
+
+    def append(self, indices: List[int], matrix: np.ndarray):
+        """
+        Durably append one finished batch (rows first, then the log line that commits them)
+
+        Args:
+            indices: original indices of the rows
+            matrix: [len(indices), dim] embeddings
+        """
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        with open(self.data_path, 'ab') as f:
+            offset = f.tell() // (matrix.shape[1] * 4)
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        entry = {'indices': [int(i) for i in indices], 'offset': offset, 'rows': int(matrix.shape[0]),
+                 'dim': int(matrix.shape[1])}
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        remove_checkpoint(str(self.path))
@@ -0,0 +1,316 @@
+############################################
+## Embedding Index Module
+## Top-k cosine similarity search over saved protein embeddings
+## ExactIndex: L2-normalized float32 matrix, batched matmul + argpartition
+## IVFPQIndex: inverted file (k-means coarse lists) + product quantization (uint8 codes),
+##             optional exact re-ranking of the PQ shortlist
+############################################
+
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Row-wise L2 normalization to float32 (zero rows stay zero)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def topk(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best k columns per row, sorted by descending score
+
+    Args:
+        scores: [n_queries, n_candidates]
+        k: number of results
+
+    Returns:
+        (scores [n_queries, k], column positions [n_queries, k])
+    """
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part_scores, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+def kmeans(x: np.ndarray, k: int, n_iter: int = 20, seed: int = 0, max_train: int = 256) -> np.ndarray:
+    """
+    Lloyd k-means on a random training sample
+
+    Args:
+        x: [n, d] float32 vectors
+        k: number of centroids
+        n_iter: iterations
+        seed: random seed
+        max_train: training points per centroid (sample size = k * max_train)
+
+    Returns:
+        [k, d] centroids
+    """
+    rng = np.random.default_rng(seed)
+    if len(x) > k * max_train:
+        x = x[rng.choice(len(x), k * max_train, replace=False)]
+    x = np.asarray(x, dtype=np.float32)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = nearest_centroid(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, np.newaxis]
+        # re-seed empty clusters with random points
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def nearest_centroid(x: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """Index of the closest centroid (L2) for every row of x, in chunks to bound memory"""
+    c_norms = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(x), dtype=np.int64)
+    for i in range(0, len(x), chunk):
+        part = np.asarray(x[i:i + chunk], dtype=np.float32)
+        dist = c_norms[np.newaxis, :] - 2 * part @ centroids.T
+        out[i:i + chunk] = dist.argmin(axis=1)
+    return out
+
+
+class ExactIndex:
+    """Brute-force cosine index over a normalized float32 matrix"""
+
+    def __init__(self, matrix: np.ndarray, ids: Optional[List] = None):
+        """
+        Args:
+            matrix: [n, d] embeddings
+            ids: optional row identifiers (default: row numbers)
+        """
+        self.vectors = normalize(matrix)
+        self.ids = list(ids) if ids is not None else list(range(len(self.vectors)))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, k: int = 10, chunk: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k cosine neighbours for a batch of queries
+
+        Args:
+            queries: [n_queries, d] (or [d]) embeddings
+            k: neighbours per query
+            chunk: queries per matmul (bounds the [chunk, n] score block)
+
+        Returns:
+            (cosine scores [n_queries, k], row positions [n_queries, k])
+        """
+        queries = normalize(np.atleast_2d(queries))
+        k = min(k, len(self.vectors))
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        rows = np.empty((len(queries), k), dtype=np.int64)
+        for i in range(0, len(queries), chunk):
+            block = queries[i:i + chunk] @ self.vectors.T
+            scores[i:i + chunk], rows[i:i + chunk] = topk(block, k)
+        return scores, rows
+
+    def save(self, path: str):
+        np.savez(path, kind="exact", vectors=self.vectors, ids=np.asarray(self.ids, dtype=object))
+
+
+class IVFPQIndex:
+    """Inverted-file + product-quantized approximate cosine index"""
+
+    def __init__(self, nlist: int = 1024, m: int = 16, nprobe: int = 16, seed: int = 0, max_train: int = 64):
+        """
+        Args:
+            nlist: number of coarse k-means lists
+            m: PQ sub-spaces (embedding dim must be divisible by m); 256 codes each (uint8)
+            nprobe: lists visited per query
+            seed: random seed for k-means
+            max_train: k-means training points per centroid
+        """
+        self.nlist = nlist
+        self.m = m
+        self.nprobe = nprobe
+        self.seed = seed
+        self.max_train = max_train
+        self.centroids = None
+        self.codebooks = None
+        self.codes = None
+        self.list_offsets = None
+        self.rows = None
+        self.ids = []
+        self.vectors = None
+
+    def __len__(self):
+        return 0 if self.codes is None else len(self.codes)
+
+    def _split(self, x: np.ndarray) -> np.ndarray:
+        """[n, d] -> [m, n, d/m] sub-vectors"""
+        return x.reshape(len(x), self.m, -1).transpose(1, 0, 2)
+
+    def train(self, matrix: np.ndarray):
+        """Learn coarse centroids and PQ codebooks from (a sample of) normalized vectors"""
+        x = normalize(matrix)
+        if x.shape[1] % self.m:
+            raise ValueError(f"Embedding dim {x.shape[1]} is not divisible by m={self.m}")
+        self.nlist = min(self.nlist, len(x))
+        self.centroids = kmeans(x, self.nlist, seed=self.seed, max_train=self.max_train)
+
+        ksub = min(256, len(x))
+        self.codebooks = np.stack([
+            kmeans(sub, ksub, seed=self.seed + j, max_train=self.max_train) for j, sub in enumerate(self._split(x))
+        ])
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        """PQ codes [n, m] uint8 of normalized vectors"""
+        codes = np.empty((len(x), self.m), dtype=np.uint8)
+        for j, sub in enumerate(self._split(x)):
+            codes[:, j] = nearest_centroid(sub, self.codebooks[j])
+        return codes
+
+    def add(self, matrix: np.ndarray, ids: Optional[List] = None, keep_vectors: bool = False):
+        """
+        Assign vectors to lists and store their PQ codes (replaces previous contents)
+
+        Args:
+            matrix: [n, d] embeddings
+            ids: optional row identifiers (default: row numbers)
+            keep_vectors: keep normalized float32 vectors for exact re-ranking
+        """
+        x = normalize(matrix)
+        assign = nearest_centroid(x, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        self.rows = order
+        self.codes = self.encode(x[order])
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.nlist))])
+        self.ids = list(ids) if ids is not None else list(range(len(x)))
+        self.vectors = x if keep_vectors else None
+
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: Optional[int] = None,
+               rerank: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k cosine neighbours for a batch of queries
+
+        Args:
+            queries: [n_queries, d] (or [d]) embeddings
+            k: neighbours per query
+            nprobe: lists visited per query (default: self.nprobe)
+            rerank: if > 0, re-score the best k * rerank PQ candidates exactly (needs kept vectors)
+
+        Returns:
+            (scores [n_queries, k], row positions [n_queries, k]; -1 where fewer than k candidates)
+        """
+        if rerank and self.vectors is None:
+            raise ValueError("rerank needs the raw vectors: add(..., keep_vectors=True) before saving the index")
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probes = topk(queries @ self.centroids.T, nprobe)[1]
+        # asymmetric distance tables: inner product of each query sub-vector with every code
+        tables = np.einsum("mqd,mcd->qmc", self._split(queries), self.codebooks)
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        sub_index = np.arange(self.m)
+        for q in range(len(queries)):
+            spans = [np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in probes[q]]
+            cand = np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+            if len(cand) == 0:
+                continue
+            approx = tables[q][sub_index, self.codes[cand]].sum(axis=1)
+
+            if rerank:
+                _, short = topk(approx[np.newaxis, :], k * rerank)
+                cand = cand[short[0]]
+                approx = self.vectors[self.rows[cand]] @ queries[q]
+
+            best_scores, best = topk(approx[np.newaxis, :], k)
+            n = best.shape[1]
+            scores[q, :n] = best_scores[0]
+            rows[q, :n] = self.rows[cand[best[0]]]
+        return scores, rows
+
+    def save(self, path: str):
+        """Write the index (and the kept re-ranking vectors, if any) to one .npz file"""
+        extra = {"vectors": self.vectors} if self.vectors is not None else {}
+        np.savez(path, kind="ivfpq", nlist=self.nlist, m=self.m, nprobe=self.nprobe, centroids=self.centroids,
+                 codebooks=self.codebooks, codes=self.codes, list_offsets=self.list_offsets, rows=self.rows,
+                 ids=np.asarray(self.ids, dtype=object), **extra)
+
+
+def load_index(path: str):
+    """Load an index written by ExactIndex.save / IVFPQIndex.save"""
+    data = np.load(path, allow_pickle=True)
+    if str(data["kind"]) == "exact":
+        index = ExactIndex.__new__(ExactIndex)
+        index.vectors = data["vectors"]
+        index.ids = list(data["ids"])
+        return index
+
+    index = IVFPQIndex(nlist=int(data["nlist"]), m=int(data["m"]), nprobe=int(data["nprobe"]))
+    for name in ("centroids", "codebooks", "codes", "list_offsets", "rows"):
+        setattr(index, name, data[name])
+    index.ids = list(data["ids"])
+    index.vectors = data["vectors"] if "vectors" in data.files else None
+    return index
+
+
+def load_saved_embeddings(matrix_paths: List[str]) -> Tuple[np.ndarray, List[dict]]:
+    """
+    Concatenate the valid rows of one or more saved *_embeddings.npy outputs (see save_embeddings_npy)
+
+    Args:
+        matrix_paths: paths to <stem>_embeddings.npy files
+
+    Returns:
+        (float32 matrix [n_valid, d], ids: one dict per row with genome, locus_tag, protein_id, row)
+    """
+    blocks = []
+    ids = []
+    for path in matrix_paths:
+        stem = path[:-len('.npy')] if path.endswith('.npy') else path
+        matrix = np.load(stem + '.npy', mmap_mode='r')
+        with open(stem + '_index.json', 'r') as f:
+            meta = json.load(f)
+        valid = np.unpackbits(np.load(stem + '_valid.npy'), count=meta["n_rows"]).astype(bool)
+        rows = np.flatnonzero(valid)
+        blocks.append(np.asarray(matrix[rows], dtype=np.float32))
+        genome = Path(meta.get("file_name") or stem).stem
+        for row in rows:
+            ids.append({"genome": genome, "row": int(row), **meta["rows"][row]})
+    return np.vstack(blocks), ids
+
+
+def build_index(matrix_paths: List[str], kind: str = "auto", exact_limit: int = 200_000, keep_vectors: bool = False,
+                **ivfpq_kwargs):
+    """
+    Build a cosine index from saved embeddings of one or more genomes
+
+    Args:
+        matrix_paths: paths to <stem>_embeddings.npy files
+        kind: 'exact', 'ivfpq' or 'auto' (exact up to exact_limit vectors)
+        exact_limit: collection size above which 'auto' switches to IVF-PQ
+        keep_vectors: IVF-PQ only: keep (and save) the raw vectors so searches can rerank
+        ivfpq_kwargs: IVFPQIndex arguments (nlist, m, nprobe, seed, max_train)
+
+    Returns:
+        ExactIndex or IVFPQIndex; index.ids holds the genome/locus_tag/protein_id of every row
+    """
+    matrix, ids = load_saved_embeddings(matrix_paths)
+    if kind == "auto":
+        kind = "exact" if len(matrix) <= exact_limit else "ivfpq"
+    print(f"Building {kind} index over {len(matrix)} embeddings from {len(matrix_paths)} file(s)")
+
+    if kind == "exact":
+        return ExactIndex(matrix, ids)
+    if kind != "ivfpq":
+        raise ValueError(f"Unsupported index kind '{kind}', expected exact, ivfpq or auto")
+    index = IVFPQIndex(**ivfpq_kwargs)
+    index.train(matrix)
+    index.add(matrix, ids, keep_vectors=keep_vectors)
+    return index
@@ -1,7 +1,7 @@
 ############################################
 ## ESM2 Embedding Module
 ## Input: protein sequences list
-## Output: average token embeddings as pkl file
+## Output: average token embeddings as .npy matrix (or legacy pkl file)
 ############################################
 
 from transformers import AutoTokenizer, AutoModel
@@ -9,33 +9,288 @@ import torch
 import numpy as np
 import pickle
 import gc
-from typing import List, Optional
+import os
+import json
+import heapq
+import time
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from main.embedding_cache import EmbeddingCache, open_cache
+from main.embedding_checkpoint import EmbeddingCheckpoint, checkpoint_dir, remove_checkpoint
+
+
+DEFAULT_MODEL = "facebook/esm2_t6_8M_UR50D"
+
+# Inference modes accepted by ESMEmbedder(dtype=...) -> dtype the weights are loaded in
+#   fp32: full precision baseline
+#   fp16: half precision weights (GPU only)
+#   bf16: bfloat16 weights, fast on CPUs with AVX512-BF16/AMX and on Ampere+ GPUs
+#   int8: fp32 weights with nn.Linear layers dynamically quantized to int8 (CPU only)
+DTYPES = {
+    "fp32": torch.float32,
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+    "int8": torch.float32,
+}
+
+
+# Pooling names accepted by ESMEmbedder.encode_multi
+#   mean:        attention-mask aware mean of the last hidden state (default embedding)
+#   cls:         BOS (<cls>) token of the last hidden state
+#   max:         attention-mask aware max over tokens of the last hidden state
+#   mean_last<k>: mean over the last k layers of each layer's token mean (needs output_hidden_states)
+BASE_POOLINGS = ("mean", "cls", "max")
+
+
+VALID_AA = 'ACDEFGHIKLMNPQRSTVWY*'
+# every byte that is not a valid (upper-case) amino acid, deleted by bytes.translate in one C-level pass
+_INVALID_BYTES = bytes(b for b in range(256) if chr(b) not in VALID_AA)
+
+
+def clean_sequences(sequences: List[Optional[str]]) -> List[str]:
+    """
+    Bulk sequence cleaning (upper-case, keep only valid amino acids) for a whole genome
+    
+    Args:
+        sequences: raw protein sequences (None allowed)
+        
+    Returns:
+        cleaned sequences ('' for empty/None input)
+    """
+    return [
+        seq.upper().encode('ascii', 'ignore').translate(None, _INVALID_BYTES).decode('ascii') if seq else ''
+        for seq in sequences
+    ]
+
+
+def is_oom_error(e: BaseException) -> bool:
+    """True for CUDA or host allocation failures (retryable with a smaller batch)"""
+    if isinstance(e, MemoryError):
+        return True
+    oom_type = getattr(torch.cuda, "OutOfMemoryError", None)
+    if oom_type is not None and isinstance(e, oom_type):
+        return True
+    message = str(e).lower()
+    return isinstance(e, RuntimeError) and any(
+        text in message for text in ("out of memory", "can't allocate memory", "failed to allocate")
+    )
+
+
+class FastTokenizer:
+    """
+    Padded integer tokenization for ESM's fixed one-token-per-residue vocabulary
+    
+    Cleaned sequences are mapped through a 256-entry NumPy byte lookup table straight into a
+    padded [batch, tokens] array, matching the HuggingFace tokenizer with truncation
+    (<cls> + first max_length-2 tokens + <eos>). Like the HuggingFace ESM tokenizer, a run of
+    characters outside the vocabulary (e.g. '**') becomes a single <unk>.
+    """
+    
+    def __init__(self, lut: np.ndarray, cls_id: int, eos_id: int, pad_id: int, unk_id: Optional[int] = None):
+        self.lut = lut
+        self.cls_id = cls_id
+        self.eos_id = eos_id
+        self.pad_id = pad_id
+        self.unk_id = unk_id
+    
+    @classmethod
+    def from_hf(cls, tokenizer) -> Optional["FastTokenizer"]:
+        """Build from a HuggingFace ESM tokenizer, or None if its vocabulary is not per-residue"""
+        vocab = tokenizer.get_vocab()
+        unk_id = tokenizer.unk_token_id
+        lut = np.full(256, unk_id, dtype=np.int64)
+        for aa in VALID_AA:
+            lut[ord(aa)] = vocab.get(aa, unk_id)
+        
+        # only trust the fast path if it reproduces the reference tokenizer, including how it
+        # handles a run of unknown characters
+        probe = VALID_AA + "**" + VALID_AA
+        expected = tokenizer(probe)["input_ids"]
+        fast = cls(lut, tokenizer.cls_token_id, tokenizer.eos_token_id, tokenizer.pad_token_id, unk_id)
+        if None in (fast.cls_id, fast.eos_id, fast.pad_id) or fast([probe])[0][0].tolist() != expected:
+            print("Fast tokenizer disabled: vocabulary is not one token per residue")
+            return None
+        return fast
+    
+    def token_ids(self, sequence: str) -> np.ndarray:
+        """Residue token ids of one cleaned sequence (runs of <unk> merged, no truncation)"""
+        ids = self.lut[np.frombuffer(sequence.encode('ascii'), dtype=np.uint8)]
+        if self.unk_id is not None:
+            unk = ids == self.unk_id
+            if unk[1:].any():
+                keep = np.ones(len(ids), dtype=bool)
+                keep[1:] = ~(unk[1:] & unk[:-1])
+                ids = ids[keep]
+        return ids
+    
+    def __call__(self, sequences: List[str], max_length: int = 1024):
+        """
+        Tokenize cleaned sequences
+        
+        Args:
+            sequences: cleaned protein sequences
+            max_length: maximum tokens per sequence (including <cls>/<eos>)
+            
+        Returns:
+            (input_ids [batch, tokens] int64, attention_mask [batch, tokens] int64)
+        """
+        tokens = [self.token_ids(seq)[:max_length - 2] for seq in sequences]
+        width = max(len(ids) for ids in tokens) + 2 if sequences else 2
+        input_ids = np.full((len(sequences), width), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(sequences), width), dtype=np.int64)
+        
+        for row, ids in enumerate(tokens):
+            n = len(ids)
+            input_ids[row, 0] = self.cls_id
+            input_ids[row, 1:n + 1] = ids
+            input_ids[row, n + 1] = self.eos_id
+            attention_mask[row, :n + 2] = 1
+        
+        return input_ids, attention_mask
+
+
+def validate_poolings(poolings: List[str]) -> List[str]:
+    """Check pooling names and return them de-duplicated in order"""
+    checked = []
+    for name in poolings:
+        if name not in BASE_POOLINGS:
+            k = name[len("mean_last"):] if name.startswith("mean_last") else ""
+            if not k.isdigit() or int(k) < 1:
+                raise ValueError(f"Unsupported pooling '{name}', expected one of {list(BASE_POOLINGS)} or mean_last<k>")
+        if name not in checked:
+            checked.append(name)
+    return checked
+
+
+def schedule_batches(lengths: List[int], max_tokens: int = 16384, max_batch_size: int = 32,
+                     max_length: int = 1024) -> List[List[int]]:
+    """
+    Length-bucketed, token-budgeted batch scheduler
+    
+    Sequences are sorted by length (longest first) and packed greedily so that
+    the padded size of each batch (batch_size * longest tokens) stays within max_tokens.
+    
+    Args:
+        lengths: cleaned sequence lengths (residues)
+        max_tokens: padded token budget per batch
+        max_batch_size: maximum number of sequences per batch
+        max_length: maximum sequence length (tokens, including BOS/EOS)
+        
+    Returns:
+        list of batches, each a list of positions into `lengths`
+    """
+    # +2 for BOS/EOS, capped by tokenizer truncation
+    n_tokens = [min(length + 2, max_length) for length in lengths]
+    order = sorted(range(len(lengths)), key=lambda i: n_tokens[i], reverse=True)
+    
+    batches = []
+    current = []
+    for pos in order:
+        # sorted descending, so the first sequence of a batch sets its padded width
+        width = n_tokens[current[0]] if current else n_tokens[pos]
+        if current and (len(current) >= max_batch_size or (len(current) + 1) * width > max_tokens):
+            batches.append(current)
+            current = []
+        current.append(pos)
+    if current:
+        batches.append(current)
+    
+    return batches
+
+
+def model_identity(model_name: str, dtype: str = "fp32") -> str:
+    """Model identity used in cache keys and checkpoint fingerprints (see ESMEmbedder.model_id)"""
+    return model_name if dtype == "fp32" else f"{model_name}:{dtype}"
+
 
 class ESMEmbedder:
     """ESM2 based protein sequence embedding generator"""
     
-    def __init__(self, model_name: str = "facebook/esm2_t6_8M_UR50D", device: Optional[str] = None):
+    def __init__(self, model_name: str = DEFAULT_MODEL, device: Optional[str] = None, dtype: str = "fp32"):
         """
         Initialize ESM2 model
         
         Args:
             model_name: HuggingFace model name
             device: 'cuda' or 'cpu', auto-detect if None
+            dtype: weight dtype, one of DTYPES
         """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}', expected one of {list(DTYPES)}")
+        
+        self.model_name = model_name
         self.device = device if device else ("cuda" if torch.cuda.is_available() else "cpu")
+        self.dtype = dtype
         
-        print(f"Loading ESM2 model on {self.device}...")
+        if dtype == "int8" and self.device != "cpu":
+            raise ValueError("int8 dynamic quantization is only supported on cpu")
+        if dtype == "fp16" and self.device == "cpu":
+            raise ValueError("fp16 inference is not supported on cpu, use bf16 or int8")
+        
+        print(f"Loading ESM2 model on {self.device} ({dtype})...")
+        start = time.perf_counter()
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name, torch_dtype=DTYPES[dtype])
         self.model = self.model.to(self.device)
         self.model.eval()
+        self.fast_tokenizer = FastTokenizer.from_hf(self.tokenizer)
+        if dtype == "int8":
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.load_seconds = time.perf_counter() - start
         
-        print(f"Model loaded successfully on {self.device}")
-        if torch.cuda.is_available():
+        print(f"Model loaded successfully on {self.device} in {self.load_seconds:.2f}s")
+        if self.on_cuda:
             print(f"CUDA memory allocated: {torch.cuda.memory_allocated()/1024**3:.2f} GB")
     
+    @property
+    def on_cuda(self) -> bool:
+        return self.device.startswith("cuda")
+    
+    @property
+    def model_id(self) -> str:
+        """Model identity used in cache keys (non-fp32 modes produce slightly different vectors)"""
+        return model_identity(self.model_name, self.dtype)
+    
+    def free_memory(self):
+        """Release cached allocator blocks after an out-of-memory error"""
+        gc.collect()
+        if self.on_cuda:
+            torch.cuda.empty_cache()
+    
+    def reset_peak_memory(self):
+        if self.on_cuda:
+            torch.cuda.reset_peak_memory_stats(self.device)
+    
+    def peak_memory_mb(self) -> Optional[float]:
+        """Peak CUDA memory since reset_peak_memory (None on cpu, which has no per-batch peak)"""
+        if self.on_cuda:
+            return torch.cuda.max_memory_allocated(self.device) / 1024**2
+        return None
+    
+    @staticmethod
+    def process_peak_rss_mb() -> float:
+        """Peak RSS of this process over its whole lifetime (cannot be reset per batch)"""
+        if resource is None:
+            return 0.0
+        # ru_maxrss is reported in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    
+    def memory_stats(self, peak_mb: float) -> dict:
+        """Memory entry of encode stats: per-batch CUDA peak, or the lifetime process RSS on cpu"""
+        if self.on_cuda:
+            return {"peak_memory_mb": round(peak_mb, 1)}
+        return {"process_peak_rss_mb": round(self.process_peak_rss_mb(), 1)}
+    
     def clean_sequence(self, sequence: str) -> str:
         """
         Clean protein sequence (keep only valid amino acids)
@@ -46,16 +301,42 @@ class ESMEmbedder:
         Returns:
             cleaned sequence
         """
-        valid_aa = set('ACDEFGHIKLMNPQRSTVWY*')
-        return ''.join(c for c in sequence.upper() if c in valid_aa)
+        return clean_sequences([sequence])[0]
+    
+    def tokenize(self, sequences: List[str], max_length: int = 1024) -> Dict[str, torch.Tensor]:
+        """
+        Tokenize cleaned sequences into padded model inputs on self.device
+        
+        Uses FastTokenizer when the vocabulary allows it, the HuggingFace tokenizer otherwise.
+        
+        Args:
+            sequences: cleaned protein sequences
+            max_length: maximum sequence length (tokens, including BOS/EOS)
+            
+        Returns:
+            dict with input_ids and attention_mask tensors
+        """
+        if self.fast_tokenizer is not None:
+            input_ids, attention_mask = self.fast_tokenizer(sequences, max_length=max_length)
+            inputs = {"input_ids": torch.from_numpy(input_ids), "attention_mask": torch.from_numpy(attention_mask)}
+        else:
+            inputs = self.tokenizer(
+                [seq[:max_length] for seq in sequences],
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=max_length
+            )
+        return {k: v.to(self.device) for k, v in inputs.items()}
     
-    def encode_single(self, sequence: str, max_length: int = 1024):
+    def encode_single(self, sequence: str, max_length: int = 1024, oom_retries: int = 2):
         """
         Encode single protein sequence to average token embedding
         
         Args:
             sequence: protein sequence
             max_length: maximum sequence length
+            oom_retries: retries after freeing memory when allocation fails
             
         Returns:
             average token embedding as numpy array [1, embedding_dim]
@@ -63,123 +344,1092 @@ class ESMEmbedder:
         if len(sequence) > max_length:
             sequence = sequence[:max_length]
         
-        try:
-            inputs = self.tokenizer(
-                sequence,
-                return_tensors="pt",
-                padding=False,
-                truncation=True,
-                max_length=max_length
-            )
+        for attempt in range(oom_retries + 1):
+            try:
+                inputs = self.tokenizer(
+                    sequence,
+                    return_tensors="pt",
+                    padding=False,
+                    truncation=True,
+                    max_length=max_length
+                )
+                
+                inputs = {k: v.to(self.device) for k, v in inputs.items()}
+                
+                with torch.no_grad():
+                    outputs = self.model(**inputs)
+                
+                avg_embedding = outputs.last_hidden_state.mean(dim=1)
+                result = avg_embedding.float().cpu().numpy()
+                
+                del inputs, outputs, avg_embedding
+                if self.on_cuda:
+                    torch.cuda.empty_cache()
+                
+                return result
+                
+            except Exception as e:
+                if is_oom_error(e) and attempt < oom_retries:
+                    print(f"Out of memory encoding sequence (length {len(sequence)}), retry {attempt + 1}/{oom_retries}")
+                    self.free_memory()
+                    continue
+                print(f"Error encoding sequence (length {len(sequence)}): {e}")
+                return None
+    
+    @staticmethod
+    def mean_pool(hidden_state: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """
+        Attention-mask aware mean over the token axis (padding never enters the average)
+        
+        Args:
+            hidden_state: [batch, tokens, dim] token embeddings
+            attention_mask: [batch, tokens] 1 for real tokens, 0 for padding
             
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        Returns:
+            [batch, dim] mean token embedding per sequence
+        """
+        # accumulate in fp32 so bf16/fp16 activations do not lose precision in the sum
+        mask = attention_mask.unsqueeze(-1).float()
+        summed = (hidden_state.float() * mask).sum(dim=1)
+        counts = mask.sum(dim=1).clamp(min=1)
+        return summed / counts
+    
+    def pool(self, outputs, attention_mask: torch.Tensor, poolings: List[str]) -> Dict[str, torch.Tensor]:
+        """
+        Compute several poolings from one forward pass
+        
+        Args:
+            outputs: model outputs (hidden_states required for mean_last<k>)
+            attention_mask: [batch, tokens] 1 for real tokens, 0 for padding
+            poolings: pooling names (see validate_poolings)
             
-            with torch.no_grad():
-                outputs = self.model(**inputs)
+        Returns:
+            dict of pooling name -> [batch, dim] tensor
+        """
+        last = outputs.last_hidden_state
+        pooled = {}
+        for name in poolings:
+            if name == "mean":
+                pooled[name] = self.mean_pool(last, attention_mask)
+            elif name == "cls":
+                pooled[name] = last[:, 0].float()
+            elif name == "max":
+                masked = last.float().masked_fill(attention_mask.unsqueeze(-1) == 0, float("-inf"))
+                pooled[name] = masked.max(dim=1).values
+            else:
+                k = int(name[len("mean_last"):])
+                # hidden_states[0] is the embedding layer output
+                layers = outputs.hidden_states[-k:]
+                pooled[name] = torch.stack([self.mean_pool(h, attention_mask) for h in layers]).mean(dim=0)
+        return pooled
+    
+    def encode_pooled(self, sequences: List[str], poolings: List[str], max_length: int = 1024) -> Dict[str, np.ndarray]:
+        """
+        Encode a mini-batch of cleaned sequences in a single padded forward pass
+        
+        Args:
+            sequences: cleaned protein sequences
+            poolings: pooling names (see validate_poolings)
+            max_length: maximum sequence length (tokens, including BOS/EOS)
             
-            avg_embedding = outputs.last_hidden_state.mean(dim=1)
-            result = avg_embedding.cpu().numpy()
+        Returns:
+            dict of pooling name -> numpy array [len(sequences), embedding_dim]
+        """
+        inputs = self.tokenize(sequences, max_length=max_length)
+        need_hidden = any(name.startswith("mean_last") for name in poolings)
+        
+        with torch.no_grad():
+            outputs = self.model(**inputs, output_hidden_states=need_hidden)
+        
+        pooled = self.pool(outputs, inputs["attention_mask"], poolings)
+        result = {name: tensor.float().cpu().numpy() for name, tensor in pooled.items()}
+        
+        del inputs, outputs, pooled
+        return result
+    
+    def encode_padded(self, sequences: List[str], max_length: int = 1024) -> np.ndarray:
+        """
+        Encode a mini-batch of cleaned sequences in a single padded forward pass
+        
+        Args:
+            sequences: cleaned protein sequences
+            max_length: maximum sequence length (tokens, including BOS/EOS)
             
-            del inputs, outputs, avg_embedding
-            torch.cuda.empty_cache()
+        Returns:
+            average token embeddings as numpy array [len(sequences), embedding_dim]
+        """
+        return self.encode_pooled(sequences, ["mean"], max_length=max_length)["mean"]
+    
+    def encode_long(self, sequence: str, max_length: int = 1024, window_overlap: int = 128,
+                    max_tokens: Optional[int] = 16384) -> np.ndarray:
+        """
+        Encode a sequence longer than max_length with overlapping sliding windows
+        
+        Each residue token is weighted by 1 / (number of windows covering it), BOS is taken from
+        the first window and EOS from the last, so the result approximates the mean over all
+        tokens of a full-length forward pass. Windows run in batches of at most max_tokens
+        padded tokens and only a running sum is kept, so memory is bounded by the window size.
+        
+        Args:
+            sequence: cleaned protein sequence
+            max_length: window size (tokens, including BOS/EOS)
+            window_overlap: residues shared by neighbouring windows
+            max_tokens: padded token budget per forward pass
+            
+        Returns:
+            average token embedding as numpy array [1, embedding_dim]
+        """
+        window = max_length - 2
+        if len(sequence) <= window:
+            return self.encode_padded([sequence], max_length=max_length)
+        
+        stride = max(1, window - window_overlap)
+        starts = list(range(0, len(sequence) - window + 1, stride))
+        if starts[-1] + window < len(sequence):
+            starts.append(len(sequence) - window)
+        
+        coverage = np.zeros(len(sequence), dtype=np.float32)
+        for start in starts:
+            coverage[start:start + window] += 1
+        
+        per_pass = max(1, (max_tokens or max_length) // max_length)
+        total = None
+        for i in range(0, len(starts), per_pass):
+            group = starts[i:i + per_pass]
+            inputs = self.tokenize([sequence[start:start + window] for start in group], max_length=max_length)
             
-            return result
+            with torch.no_grad():
+                hidden = self.model(**inputs).last_hidden_state.float().cpu().numpy()
             
+            for start, tokens in zip(group, hidden):
+                weights = 1.0 / coverage[start:start + window]
+                window_sum = (tokens[1:window + 1] * weights[:, np.newaxis]).sum(axis=0)
+                if start == starts[0]:
+                    window_sum = window_sum + tokens[0]
+                if start == starts[-1]:
+                    window_sum = window_sum + tokens[window + 1]
+                total = window_sum if total is None else total + window_sum
+            
+            del inputs, hidden
+        
+        # residues + BOS + EOS, as in a full-length forward pass
+        return (total / (len(sequence) + 2))[np.newaxis, :]
+    
+    def group_sequences(self, sequences: List[str]) -> Dict[str, List[int]]:
+        """
+        Clean sequences and group identical ones (each unique protein is embedded once)
+        
+        Args:
+            sequences: raw protein sequences (empty/None entries are skipped)
+            
+        Returns:
+            dict of cleaned sequence -> every original index carrying it
+        """
+        groups: Dict[str, List[int]] = {}
+        for idx, clean_seq in enumerate(clean_sequences(sequences)):
+            if clean_seq:
+                groups.setdefault(clean_seq, []).append(idx)
+        return groups
+    
+    def _encode_one(self, seq: str, poolings: List[str], max_length: int = 1024) -> Optional[Dict[str, np.ndarray]]:
+        """Per-sequence fallback of _iter_batches: pooling name -> embedding row, or None on failure"""
+        if poolings == ["mean"]:
+            emb = self.encode_single(seq, max_length=max_length)
+            return None if emb is None else {"mean": emb[0]}
+        try:
+            pooled = self.encode_pooled([seq], poolings, max_length=max_length)
         except Exception as e:
-            print(f"Error encoding sequence (length {len(sequence)}): {e}")
+            print(f"Error encoding sequence (length {len(seq)}): {e}")
+            if is_oom_error(e):
+                self.free_memory()
             return None
+        return {name: matrix[0] for name, matrix in pooled.items()}
     
-    def encode_batch(self, sequences: List[str], batch_size: int = 32, show_progress: bool = True):
+    def _iter_batches(self, unique: List[tuple], poolings: List[str], batch_size: int = 32,
+                      max_length: int = 1024, max_tokens: Optional[int] = 16384, show_progress: bool = True,
+                      oom_retries: int = 3, counters: Optional[dict] = None):
         """
-        Encode multiple protein sequences
+        Run length-bucketed padded batches with adaptive out-of-memory handling
+        
+        On an allocation failure the batch is retried in halves and the lowered token budget is kept
+        for the rest of the call; a single sequence that still runs out of memory is retried up to
+        oom_retries times. Any other error falls back to per-sequence encoding.
+        
+        Args:
+            unique: (cleaned sequence, original indices) pairs to embed
+            poolings: pooling names computed by every forward pass (see encode_pooled)
+            batch_size, max_length, max_tokens, show_progress, oom_retries: see iter_encode
+            counters: optional dict; oom_events and failed are added to, token_ceiling and
+                peak_memory_mb (max per-batch CUDA peak) are set
+            
+        Yields:
+            list of (pooling name -> embedding row, cleaned sequence, original indices) per finished batch
+        """
+        if counters is None:
+            counters = {}
+        counters.setdefault("oom_events", 0)
+        counters.setdefault("failed", 0)
+        ceiling = max_tokens if max_tokens else batch_size * max_length
+        queue = deque(
+            [unique[pos] for pos in positions]
+            for positions in schedule_batches([len(seq) for seq, _ in unique], max_tokens=ceiling,
+                                              max_batch_size=batch_size, max_length=max_length)
+        )
+        
+        done = 0
+        b = 0
+        oom_attempts: Dict[str, int] = {}
+        peak_mb = 0.0
+        while queue:
+            batch = queue.popleft()
+            width = min(max(len(seq) for seq, _ in batch) + 2, max_length)
+            if len(batch) > 1 and len(batch) * width > ceiling:
+                # scheduled before the budget was lowered: re-split under the current ceiling
+                queue.extendleft(reversed([
+                    [batch[pos] for pos in positions]
+                    for positions in schedule_batches([len(seq) for seq, _ in batch], max_tokens=ceiling,
+                                                      max_batch_size=batch_size, max_length=max_length)
+                ]))
+                continue
+            
+            self.reset_peak_memory()
+            try:
+                pooled = self.encode_pooled([seq for seq, _ in batch], poolings, max_length=max_length)
+                rows = [({name: pooled[name][row] for name in poolings}, seq, indices)
+                        for row, (seq, indices) in enumerate(batch)]
+            except Exception as e:
+                if not is_oom_error(e):
+                    print(f"Error encoding batch {b} ({len(batch)} sequences): {e}")
+                    print("Falling back to per-sequence encoding...")
+                    rows = []
+                    for seq, indices in batch:
+                        emb = self._encode_one(seq, poolings, max_length=max_length)
+                        if emb is not None:
+                            rows.append((emb, seq, indices))
+                        else:
+                            counters["failed"] += 1
+                else:
+                    self.free_memory()
+                    counters["oom_events"] += 1
+                    if len(batch) > 1:
+                        # halve the budget for the rest of the job and retry this batch in smaller pieces
+                        ceiling = max(width, (len(batch) // 2) * width)
+                        print(f"Out of memory on batch of {len(batch)} x {width} tokens, "
+                              f"token budget lowered to {ceiling}")
+                        queue.appendleft(batch)
+                        continue
+                    
+                    seq = batch[0][0]
+                    oom_attempts[seq] = oom_attempts.get(seq, 0) + 1
+                    if oom_attempts[seq] <= oom_retries:
+                        print(f"Out of memory on single sequence (length {len(seq)}), "
+                              f"retry {oom_attempts[seq]}/{oom_retries}")
+                        time.sleep(oom_attempts[seq])
+                        queue.appendleft(batch)
+                        continue
+                    print(f"Giving up on sequence (length {len(seq)}) after {oom_retries} out-of-memory retries")
+                    counters["failed"] += 1
+                    rows = []
+            
+            batch_peak = self.peak_memory_mb()
+            if batch_peak is not None:
+                peak_mb = max(peak_mb, batch_peak)
+            
+            if self.on_cuda:
+                torch.cuda.empty_cache()
+                gc.collect()
+            
+            done += len(batch)
+            b += 1
+            if show_progress and (b % 5 == 0 or not queue):
+                progress = done / len(unique) * 100
+                print(f"Progress: {done}/{len(unique)} ({progress:.1f}%) - batch {b}, "
+                      f"{len(batch)} x {width} tokens"
+                      + (f", peak {batch_peak:.0f} MB" if batch_peak is not None else ""))
+            
+            yield rows
+        
+        counters["token_ceiling"] = ceiling
+        counters["peak_memory_mb"] = peak_mb
+    
+    def iter_encode(self, sequences: List[str], batch_size: int = 32, show_progress: bool = True,
+                    max_length: int = 1024, max_tokens: Optional[int] = 16384,
+                    cache: Optional[EmbeddingCache] = None, stats: Optional[dict] = None,
+                    long_mode: bool = False, window_overlap: int = 128, skip: Optional[set] = None,
+                    oom_retries: int = 3):
+        """
+        Encode sequences and yield results batch by batch as they finish
+        
+        Identical cleaned sequences are embedded once; every yielded row is already scattered to
+        all original indices carrying that sequence. Cache hits are yielded first, then long
+        sequences (long_mode), then length-bucketed padded batches. On an allocation failure the
+        batch is retried in halves and the lowered token budget is kept for the rest of the call,
+        so no sequence is lost to transient memory pressure.
         
         Args:
             sequences: list of protein sequences
-            batch_size: number of sequences to process at once
+            batch_size: maximum number of sequences per forward pass
             show_progress: whether to print progress
+            max_length: maximum sequence length
+            max_tokens: padded token budget per forward pass (None: batch by count only)
+            cache: optional EmbeddingCache; hits skip the forward pass, misses are stored
+            stats: optional dict filled with sequence/dedup/cache/memory counts once the generator is exhausted
+            long_mode: embed sequences longer than max_length with sliding windows (encode_long)
+                instead of truncating them
+            window_overlap: residues shared by neighbouring windows in long_mode
+            skip: original indices already embedded (e.g. restored from a checkpoint)
+            oom_retries: retries of a single sequence that still runs out of memory on its own
             
-        Returns:
-            list of average token embeddings
+        Yields:
+            (original indices, float32 matrix [len(indices), embedding_dim])
         """
-        embeddings = []
         total = len(sequences)
-        
         if show_progress:
             print(f"Processing {total} sequences...")
         
-        for i in range(0, total, batch_size):
-            batch = sequences[i:i+batch_size]
-            
-            for seq in batch:
-                if seq and len(seq.strip()) > 0:
-                    clean_seq = self.clean_sequence(seq)
-                    if clean_seq:
-                        emb = self.encode_single(clean_seq)
-                        embeddings.append(emb)
-                    else:
-                        embeddings.append(None)
-                else:
-                    embeddings.append(None)
-            
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                gc.collect()
+        groups = self.group_sequences(sequences)
+        n_valid = sum(len(indices) for indices in groups.values())
+        dedup_ratio = 1 - len(groups) / n_valid if n_valid else 0.0
+        if show_progress:
+            print(f"Unique sequences: {len(groups)}/{n_valid} ({dedup_ratio:.1%} duplicates skipped)")
+        
+        # (cleaned sequence, every original index carrying it) still to be embedded
+        unique = [(seq, indices) for seq, indices in groups.items() if not (skip and indices[0] in skip)]
+        resumed = len(groups) - len(unique)
+        if resumed and show_progress:
+            print(f"Resuming: {resumed} unique sequences already embedded")
+        
+        def expand(rows):
+            indices = [idx for _, group in rows for idx in group]
+            matrix = np.stack([emb for emb, group in rows for _ in group]).astype(np.float32, copy=False)
+            return indices, matrix
+        
+        def is_long(seq: str) -> bool:
+            return long_mode and len(seq) > max_length - 2
+        
+        cache_hits = 0
+        oom_events = 0
+        failed = 0
+        keys = {}
+        if cache is not None:
+            long_pooling = f"mean_window{window_overlap}"
+            keys = {seq: cache.make_key(seq, self.model_id, max_length, long_pooling if is_long(seq) else "mean")
+                    for seq, _ in unique}
+            cached = cache.get_many(list(keys.values()))
+            hits = [(cached[keys[seq]], indices) for seq, indices in unique if keys[seq] in cached]
+            unique = [(seq, indices) for seq, indices in unique if keys[seq] not in cached]
+            cache_hits = len(hits)
+            if show_progress:
+                print(f"Embedding cache: {cache_hits}/{cache_hits + len(unique)} hits")
+            if hits:
+                yield expand(hits)
+        
+        long_unique = [(seq, indices) for seq, indices in unique if is_long(seq)]
+        if long_unique:
+            if show_progress:
+                print(f"Long-sequence mode: {len(long_unique)} sequences over {max_length - 2} residues")
+            for seq, indices in long_unique:
+                try:
+                    emb = self.encode_long(seq, max_length=max_length, window_overlap=window_overlap,
+                                           max_tokens=max_tokens)[0]
+                except Exception as e:
+                    if not is_oom_error(e):
+                        print(f"Error encoding long sequence (length {len(seq)}): {e}")
+                        failed += 1
+                        continue
+                    # one window per forward pass bounds memory by the window size
+                    oom_events += 1
+                    self.free_memory()
+                    print(f"Out of memory on long sequence (length {len(seq)}), retrying one window per pass")
+                    try:
+                        emb = self.encode_long(seq, max_length=max_length, window_overlap=window_overlap,
+                                               max_tokens=max_length)[0]
+                    except Exception as e:
+                        print(f"Error encoding long sequence (length {len(seq)}): {e}")
+                        failed += 1
+                        continue
+                if cache is not None:
+                    cache.put(keys[seq], emb)
+                yield expand([(emb, indices)])
+            unique = [(seq, indices) for seq, indices in unique if not is_long(seq)]
+        
+        counters = {"oom_events": oom_events, "failed": failed}
+        for rows in self._iter_batches(unique, ["mean"], batch_size=batch_size, max_length=max_length,
+                                       max_tokens=max_tokens, show_progress=show_progress,
+                                       oom_retries=oom_retries, counters=counters):
+            if cache is not None:
+                cache.put_many({keys[seq]: pooled["mean"] for pooled, seq, _ in rows})
+            if rows:
+                yield expand([(pooled["mean"], indices) for pooled, _, indices in rows])
+        failed = counters["failed"]
+        
+        if stats is not None:
+            stats.update({
+                "total": total,
+                "valid": n_valid,
+                "unique": len(groups),
+                "dedup_ratio": round(dedup_ratio, 4),
+                "cache_hits": cache_hits,
+                "encoded": len(unique) + len(long_unique) - failed,
+                "long_sequences": len(long_unique),
+                "resumed": resumed,
+                "oom_events": counters["oom_events"],
+                "failed": failed,
+                "token_ceiling": counters["token_ceiling"],
+                **self.memory_stats(counters["peak_memory_mb"]),
+            })
+    
+    def encode_batch(self, sequences: List[str], batch_size: int = 32, show_progress: bool = True,
+                     max_length: int = 1024, max_tokens: Optional[int] = 16384,
+                     cache: Optional[EmbeddingCache] = None, stats: Optional[dict] = None,
+                     long_mode: bool = False, window_overlap: int = 128, on_batch: Optional[Callable] = None):
+        """
+        Encode multiple protein sequences with length-bucketed padded mini-batches
+        
+        Args:
+            sequences: list of protein sequences
+            batch_size: maximum number of sequences per forward pass
+            show_progress: whether to print progress
+            max_length: maximum sequence length
+            max_tokens: padded token budget per forward pass (None: batch by count only)
+            cache: optional EmbeddingCache; hits skip the forward pass, misses are stored
+            stats: optional dict filled with sequence/dedup/cache counts for this call
+            long_mode: embed sequences longer than max_length with sliding windows (encode_long)
+                instead of truncating them
+            window_overlap: residues shared by neighbouring windows in long_mode
+            on_batch: optional callback(indices, matrix) called as each batch finishes
             
-            if show_progress and (i + batch_size) % (batch_size * 5) == 0:
-                progress = min(i + batch_size, total) / total * 100
-                print(f"Progress: {min(i + batch_size, total)}/{total} ({progress:.1f}%)")
+        Returns:
+            list of average token embeddings in input order
+            ([1, embedding_dim] arrays, None for empty/invalid input)
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(sequences)
+        for indices, matrix in self.iter_encode(sequences, batch_size=batch_size, show_progress=show_progress,
+                                                max_length=max_length, max_tokens=max_tokens, cache=cache,
+                                                stats=stats, long_mode=long_mode, window_overlap=window_overlap):
+            for idx, row in zip(indices, matrix):
+                embeddings[idx] = row[np.newaxis, :]
+            if on_batch is not None:
+                on_batch(indices, matrix)
         
         if show_progress:
             valid_count = sum(1 for emb in embeddings if emb is not None)
-            print(f"Completed: {valid_count}/{total} valid embeddings")
+            print(f"Completed: {valid_count}/{len(sequences)} valid embeddings")
+            if cache is not None:
+                print(f"Embedding cache stats: {cache.stats()}")
         
         return embeddings
     
-    def save_embeddings(self, file_name: str, embeddings: List[Optional[np.ndarray]], output_path: str):
+    def encode_multi(self, sequences: List[str], poolings: List[str] = ("mean", "cls", "max"),
+                     batch_size: int = 32, show_progress: bool = True, max_length: int = 1024,
+                     max_tokens: Optional[int] = 16384, stats: Optional[dict] = None,
+                     cache: Optional[EmbeddingCache] = None, oom_retries: int = 3):
         """
-        Save embeddings to pickle file
+        Encode sequences once and return several poolings as named matrices
+        
+        hidden_states are only requested from the model when a mean_last<k> pooling is asked for.
+        Sequences longer than max_length are truncated (long_mode is not supported on this path).
+        A sequence is a cache hit only when every requested pooling of it is cached. Batches run
+        with the same out-of-memory splitting and retries as iter_encode.
         
         Args:
-            embeddings: list of embeddings
-            output_path: path to save pickle file
+            sequences: list of protein sequences
+            poolings: pooling names (see validate_poolings)
+            batch_size: maximum number of sequences per forward pass
+            show_progress: whether to print progress
+            max_length: maximum sequence length
+            max_tokens: padded token budget per forward pass
+            stats: optional dict filled with sequence/dedup/cache counts for this call
+            cache: optional EmbeddingCache; entries are keyed per pooling
+            oom_retries: retries of a single sequence that still runs out of memory on its own
+            
+        Returns:
+            (dict of pooling name -> [N, embedding_dim] float32 matrix with zero rows for
+             missing entries, valid [N] bool mask)
         """
-        output_file = output_path + Path(file_name).stem + 'tags.txt'
-        with open(output_file, 'wb') as f:
-            pickle.dump(embeddings, f)
+        poolings = validate_poolings(list(poolings))
+        groups = self.group_sequences(sequences)
+        unique = list(groups.items())
+        dim = self.model.config.hidden_size
+        matrices = {name: np.zeros((len(sequences), dim), dtype=np.float32) for name in poolings}
+        valid = np.zeros(len(sequences), dtype=bool)
         
-        valid_count = sum(1 for emb in embeddings if emb is not None)
-        print(f"Saved {valid_count}/{len(embeddings)} embeddings to {output_file}")
+        if show_progress:
+            print(f"Processing {len(sequences)} sequences ({len(unique)} unique), poolings: {poolings}")
+        
+        cache_hits = 0
+        keys = {}
+        if cache is not None:
+            keys = {seq: {name: cache.make_key(seq, self.model_id, max_length, name) for name in poolings}
+                    for seq, _ in unique}
+            cached = cache.get_many([key for names in keys.values() for key in names.values()])
+            misses = []
+            for seq, indices in unique:
+                if all(key in cached for key in keys[seq].values()):
+                    for name, key in keys[seq].items():
+                        matrices[name][indices] = cached[key]
+                    valid[indices] = True
+                    cache_hits += 1
+                else:
+                    misses.append((seq, indices))
+            if show_progress:
+                print(f"Embedding cache: {cache_hits}/{len(unique)} hits")
+            unique = misses
+        
+        counters = {}
+        for rows in self._iter_batches(unique, poolings, batch_size=batch_size, max_length=max_length,
+                                       max_tokens=max_tokens, show_progress=show_progress,
+                                       oom_retries=oom_retries, counters=counters):
+            for pooled, _, indices in rows:
+                for name in poolings:
+                    matrices[name][indices] = pooled[name]
+                valid[indices] = True
+            if cache is not None:
+                cache.put_many({keys[seq][name]: pooled[name] for pooled, seq, _ in rows for name in poolings})
+        failed = counters["failed"]
+        
+        if stats is not None:
+            n_valid = sum(len(indices) for indices in groups.values())
+            stats.update({
+                "total": len(sequences),
+                "valid": n_valid,
+                "unique": len(groups),
+                "dedup_ratio": round(1 - len(groups) / n_valid, 4) if n_valid else 0.0,
+                "cache_hits": cache_hits,
+                "encoded": len(unique) - failed,
+                "oom_events": counters["oom_events"],
+                "failed": failed,
+                "token_ceiling": counters["token_ceiling"],
+                **self.memory_stats(counters["peak_memory_mb"]),
+                "poolings": poolings,
+            })
+        
+        if show_progress:
+            print(f"Completed: {int(valid.sum())}/{len(sequences)} valid embeddings")
+        return matrices, valid
+    
+    def save_embeddings(self, file_name: str, embeddings: List[Optional[np.ndarray]], output_path: str):
+        """Save embeddings to pickle file (see write_embeddings_pickle)"""
+        write_embeddings_pickle(file_name, embeddings, output_path)
+    
+    def save_embeddings_npy(self, file_name: str, embeddings: List[Optional[np.ndarray]], output_path: str,
+                            locus_tags: Optional[List[str]] = None, protein_ids: Optional[List[str]] = None,
+                            dtype: str = "float32") -> dict:
+        """Save embeddings in columnar form (see write_embeddings_npy)"""
+        return write_embeddings_npy(file_name, embeddings, output_path, self.model_name, locus_tags=locus_tags,
+                                    protein_ids=protein_ids, dtype=dtype)
     
     @staticmethod
-    def load_embeddings(pkl_path: str):
+    def load_embeddings(pkl_path: str, mode: str = "pickle"):
         """
-        Load embeddings from pickle file
+        Load embeddings from pickle file or columnar .npy output
         
         Args:
-            pkl_path: path to pickle file
+            pkl_path: path to pickle file, or to the *_embeddings.npy matrix when mode='mmap'
+            mode: 'pickle' (list of arrays) or 'mmap' (memory-mapped matrix, rows read on access)
             
         Returns:
-            list of embeddings
+            'pickle': list of embeddings
+            'mmap': dict with keys matrix (read-only memmap [N, D]), valid ([N] bool), index (metadata)
         """
+        if mode == "mmap":
+            stem = pkl_path[:-len('.npy')] if pkl_path.endswith('.npy') else pkl_path
+            matrix = np.load(stem + '.npy', mmap_mode='r')
+            with open(stem + '_index.json', 'r') as f:
+                index = json.load(f)
+            valid = np.unpackbits(np.load(stem + '_valid.npy'), count=index["n_rows"]).astype(bool)
+            print(f"Memory-mapped {matrix.shape[0]} x {matrix.shape[1]} embeddings from {stem}.npy")
+            return {"matrix": matrix, "valid": valid, "index": index}
+        
         with open(pkl_path, 'rb') as f:
             embeddings = pickle.load(f)
         print(f"Loaded {len(embeddings)} embeddings from {pkl_path}")
         return embeddings
 
 
-def embed_sequences(file_name: str, sequences: List[str], output_path: str, batch_size: int = 32):
+def write_embeddings_pickle(file_name: str, embeddings: List[Optional[np.ndarray]], output_path: str):
+    """
+    Save embeddings to pickle file
+
+    Args:
+        embeddings: list of embeddings
+        output_path: path to save pickle file
+    """
+    output_file = output_path + Path(file_name).stem + 'tags.txt'
+    with open(output_file, 'wb') as f:
+        pickle.dump(embeddings, f)
+
+    valid_count = sum(1 for emb in embeddings if emb is not None)
+    print(f"Saved {valid_count}/{len(embeddings)} embeddings to {output_file}")
+
+
+def write_embeddings_npy(file_name: str, embeddings: List[Optional[np.ndarray]], output_path: str,
+                         model_name: str, locus_tags: Optional[List[str]] = None,
+                         protein_ids: Optional[List[str]] = None, dtype: str = "float32") -> dict:
+    """
+    Save embeddings in columnar form
+
+    Writes three files next to each other:
+        <stem>_embeddings.npy        contiguous [N, D] matrix (zero rows for missing entries)
+        <stem>_embeddings_valid.npy  validity bitmask (np.packbits of N booleans)
+        <stem>_embeddings_index.json row -> locus_tag/protein_id map and matrix metadata
+
+    Args:
+        embeddings: list of embeddings (None for missing entries)
+        output_path: output directory prefix
+        model_name: model recorded in the index
+        locus_tags: optional locus_tag per row
+        protein_ids: optional protein_id per row
+        dtype: 'float32' or 'float16'
+
+    Returns:
+        dict of written file paths
+    """
+    matrix, valid = stack_embeddings(embeddings, dtype=dtype)
+
+    stem = output_path + Path(file_name).stem
+    paths = {
+        "matrix": stem + '_embeddings.npy',
+        "valid": stem + '_embeddings_valid.npy',
+        "index": stem + '_embeddings_index.json',
+    }
+    np.save(paths["matrix"], matrix)
+    np.save(paths["valid"], np.packbits(valid))
+
+    rows = []
+    for i in range(len(embeddings)):
+        rows.append({
+            "locus_tag": locus_tags[i] if locus_tags and i < len(locus_tags) else None,
+            "protein_id": protein_ids[i] if protein_ids and i < len(protein_ids) else None,
+        })
+    with open(paths["index"], 'w') as f:
+        json.dump({
+            "file_name": file_name,
+            "model_name": model_name,
+            "n_rows": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]),
+            "dtype": dtype,
+            "n_valid": int(valid.sum()),
+            "rows": rows,
+        }, f)
+
+    print(f"Saved {int(valid.sum())}/{len(embeddings)} embeddings to {paths['matrix']} ({dtype})")
+    return paths
+
+
+def stack_embeddings(embeddings: List[Optional[np.ndarray]], dtype: str = "float32", dim: Optional[int] = None):
+    """
+    Stack a list of per-sequence embeddings into one contiguous matrix
+    
+    Args:
+        embeddings: list of [1, D] / [D] arrays, None for missing entries
+        dtype: output dtype name
+        dim: embedding width when every entry is None
+        
+    Returns:
+        (matrix [N, D] with zero rows for missing entries, valid [N] bool mask)
+    """
+    if dim is None:
+        dim = next((int(np.asarray(emb).size) for emb in embeddings if emb is not None), 0)
+    matrix = np.zeros((len(embeddings), dim), dtype=dtype)
+    valid = np.zeros(len(embeddings), dtype=bool)
+    for i, emb in enumerate(embeddings):
+        if emb is not None:
+            matrix[i] = np.asarray(emb).reshape(-1)
+            valid[i] = True
+    return matrix, valid
+
+
+############################################
+## Model registry (one resident model per worker process)
+############################################
+
+_registry: Dict[tuple, ESMEmbedder] = {}
+_registry_lock = threading.Lock()
+_registry_stats = {"hits": 0, "misses": 0, "load_seconds": {}}
+
+
+def resolve_device(device: Optional[str] = None) -> str:
+    """Return the explicit device or auto-detect cuda/cpu"""
+    return device if device else ("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def get_embedder(model_name: str = DEFAULT_MODEL, device: Optional[str] = None, dtype: str = "fp32") -> ESMEmbedder:
+    """
+    Return the process-wide ESMEmbedder for (model_name, device, dtype), loading it on first use
+    
+    Args:
+        model_name: HuggingFace model name
+        device: 'cuda' or 'cpu', auto-detect if None
+        dtype: weight dtype, one of DTYPES
+        
+    Returns:
+        resident ESMEmbedder instance
+    """
+    key = (model_name, resolve_device(device), dtype)
+    with _registry_lock:
+        embedder = _registry.get(key)
+        if embedder is not None:
+            _registry_stats["hits"] += 1
+            return embedder
+        
+        _registry_stats["misses"] += 1
+        embedder = ESMEmbedder(model_name=key[0], device=key[1], dtype=key[2])
+        _registry[key] = embedder
+        _registry_stats["load_seconds"]["/".join(key)] = round(embedder.load_seconds, 3)
+        return embedder
+
+
+def prewarm(model_name: str = DEFAULT_MODEL, device: Optional[str] = None, dtype: str = "fp32",
+            num_procs: int = 1) -> Optional[ESMEmbedder]:
+    """
+    Load the model at worker boot so the first job does not pay the cold start
+
+    With num_procs > 1 on CPU, jobs embed in the shard pool (see embed_sequences), so the pool is
+    spawned and every child loads its model instead; no model is loaded in this process.
+
+    Returns:
+        the resident embedder, or None when the shard pool was warmed
+    """
+    if num_procs > 1 and resolve_device(device) == "cpu":
+        pool = get_shard_pool(num_procs, model_name, dtype)
+        # num_procs tasks that all wait on one barrier can only finish once every child is running,
+        # i.e. has spawned and loaded its model in the pool initializer
+        with multiprocessing.get_context("spawn").Manager() as manager:
+            barrier = manager.Barrier(num_procs)
+            futures = [pool.submit(_shard_ready, barrier) for _ in range(num_procs)]
+            pids = {future.result() for future in futures}
+        print(f"Shard pool prewarmed: {len(pids)} embedding processes ready")
+        return None
+    embedder = get_embedder(model_name, device, dtype)
+    print(f"Embedder prewarmed: {registry_stats()}")
+    return embedder
+
+
+def registry_stats() -> dict:
+    """Model registry counters: cache hits/misses, load time per resident model"""
+    with _registry_lock:
+        return {
+            "hits": _registry_stats["hits"],
+            "misses": _registry_stats["misses"],
+            "resident_models": len(_registry),
+            "load_seconds": dict(_registry_stats["load_seconds"]),
+        }
+
+
+############################################
+## Sharded multi-process embedding (CPU workers)
+############################################
+
+_shard_pool: Optional[ProcessPoolExecutor] = None
+_shard_pool_key: Optional[tuple] = None
+_shard_pool_lock = threading.Lock()
+
+
+def shard_by_length(lengths: List[int], n_shards: int, max_length: int = 1024) -> List[List[int]]:
+    """
+    Split positions into n_shards with balanced token totals (longest-first greedy)
+    
+    Args:
+        lengths: sequence lengths
+        n_shards: number of shards
+        max_length: maximum sequence length (tokens, including BOS/EOS)
+        
+    Returns:
+        list of n_shards position lists (each in ascending order)
+    """
+    heap = [(0, shard) for shard in range(n_shards)]
+    shards: List[List[int]] = [[] for _ in range(n_shards)]
+    for pos in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+        load, shard = heapq.heappop(heap)
+        shards[shard].append(pos)
+        heapq.heappush(heap, (load + min(lengths[pos] + 2, max_length), shard))
+    return [sorted(shard) for shard in shards]
+
+
+def _init_shard_worker(model_name: str, dtype: str, threads: int):
+    """Pool initializer: pin intra-op threads and load the model once per child process"""
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    get_embedder(model_name, "cpu", dtype)
+
+
+def _shard_ready(barrier, timeout: float = 900.0) -> int:
+    """Prewarm task: returns once every pool child has started (see prewarm)"""
+    barrier.wait(timeout)
+    return os.getpid()
+
+
+def _embed_shard(sequences: List[str], model_name: str, dtype: str, batch_size: int, max_tokens: Optional[int],
+                 cache_dir: Optional[str], long_mode: bool):
+    """Run encode_batch on one shard inside a pool child"""
+    embedder = get_embedder(model_name, "cpu", dtype)
+    cache = open_cache(cache_dir) if cache_dir else None
+    stats = {}
+    embeddings = embedder.encode_batch(sequences, batch_size=batch_size, max_tokens=max_tokens, cache=cache,
+                                       stats=stats, show_progress=False, long_mode=long_mode)
+    return embeddings, stats
+
+
+def get_shard_pool(num_procs: int, model_name: str = DEFAULT_MODEL, dtype: str = "fp32",
+                   threads_per_proc: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Return the resident process pool for (num_procs, model_name, dtype, threads), creating it on first use
+    
+    Children are spawned (not forked) so each gets a clean torch runtime, and keep their model
+    loaded between jobs.
+    """
+    global _shard_pool, _shard_pool_key
+    threads = threads_per_proc or max(1, (os.cpu_count() or 1) // num_procs)
+    key = (num_procs, model_name, dtype, threads)
+    with _shard_pool_lock:
+        if _shard_pool is not None and _shard_pool_key != key:
+            _shard_pool.shutdown(wait=True)
+            _shard_pool = None
+        if _shard_pool is None:
+            print(f"Starting {num_procs} embedding processes ({threads} threads each)...")
+            _shard_pool = ProcessPoolExecutor(
+                max_workers=num_procs,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_shard_worker,
+                initargs=(model_name, dtype, threads)
+            )
+            _shard_pool_key = key
+        return _shard_pool
+
+
+def shutdown_shard_pool():
+    """Stop the resident process pool"""
+    global _shard_pool, _shard_pool_key
+    with _shard_pool_lock:
+        if _shard_pool is not None:
+            _shard_pool.shutdown(wait=True)
+        _shard_pool = None
+        _shard_pool_key = None
+
+
+def encode_sharded(sequences: List[str], num_procs: int, model_name: str = DEFAULT_MODEL, dtype: str = "fp32",
+                   batch_size: int = 32, max_tokens: Optional[int] = 16384, threads_per_proc: Optional[int] = None,
+                   cache_dir: Optional[str] = None, long_mode: bool = False, stats: Optional[dict] = None,
+                   on_batch: Optional[Callable] = None, skip: Optional[set] = None):
+    """
+    Embed sequences across a pool of CPU processes and gather results in input order
+    
+    Args:
+        sequences: list of protein sequences
+        num_procs: number of worker processes
+        model_name, dtype: model to load in every child (device is always cpu)
+        batch_size: maximum sequences per batch
+        max_tokens: padded token budget per batch
+        threads_per_proc: torch intra-op threads per child (default: cpu_count // num_procs)
+        cache_dir: directory of the persistent embedding cache (shared by all children)
+        long_mode: sliding-window embedding for long sequences
+        stats: optional dict filled with summed per-shard counts
+        on_batch: optional callback(indices, matrix) called with each shard's rows as the shard finishes
+        skip: original indices already embedded (e.g. restored from a checkpoint); left as None
+        
+    Returns:
+        list of embeddings (same order as sequences)
+    """
+    pool = get_shard_pool(num_procs, model_name, dtype, threads_per_proc)
+    skip = skip or set()
+    
+    # identical sequences go to the same shard so per-shard dedup still catches them
+    members: Dict[str, List[int]] = {}
+    for idx, seq in enumerate(sequences):
+        if idx not in skip:
+            members.setdefault(seq or "", []).append(idx)
+    unique_idx = [indices[0] for indices in members.values()]
+    shards = shard_by_length([len(sequences[i] or "") for i in unique_idx], num_procs)
+    
+    futures = {}
+    for shard in shards:
+        if not shard:
+            continue
+        indices = [unique_idx[pos] for pos in shard]
+        futures[pool.submit(_embed_shard, [sequences[i] for i in indices], model_name, dtype,
+                            batch_size, max_tokens, cache_dir, long_mode)] = indices
+    
+    by_seq: Dict[str, Optional[np.ndarray]] = {}
+    merged = {"total": len(sequences), "valid": 0, "unique": 0, "cache_hits": 0, "encoded": 0,
+              "long_sequences": 0, "failed": 0, "resumed": len(skip), "shards": len(futures)}
+    for future in as_completed(futures):
+        shard_embeddings, shard_stats = future.result()
+        rows = []
+        for idx, emb in zip(futures[future], shard_embeddings):
+            seq = sequences[idx] or ""
+            by_seq[seq] = emb
+            if emb is not None:
+                rows.append((emb, members[seq]))
+        for name in ("unique", "cache_hits", "encoded", "long_sequences", "failed"):
+            merged[name] += shard_stats.get(name, 0)
+        if on_batch is not None and rows:
+            on_batch([idx for _, group in rows for idx in group],
+                     np.vstack([emb for emb, group in rows for _ in group]).astype(np.float32))
+    
+    embeddings = [None if idx in skip else by_seq.get(seq or "") for idx, seq in enumerate(sequences)]
+    merged["valid"] = sum(1 for emb in embeddings if emb is not None) + len(skip)
+    merged["dedup_ratio"] = round(1 - merged["unique"] / merged["valid"], 4) if merged["valid"] else 0.0
+    if stats is not None:
+        stats.update(merged)
+    print(f"Sharded embedding completed: {merged['valid']}/{len(sequences)} valid embeddings "
+          f"across {len(futures)} processes")
+    return embeddings
+
+
+def _checkpoint_fingerprint(sequences: List[str], model_id: str, long_mode: bool) -> str:
+    return EmbeddingCheckpoint.fingerprint(sequences, model_id, 1024, long_mode)
+
+
+def job_checkpoint_dir(file_name: str, sequences: List[str], output_path: str, model_id: str,
+                       long_mode: bool = False) -> str:
+    """Checkpoint directory iter_embed_sequences uses for these inputs"""
+    return checkpoint_dir(file_name, output_path, _checkpoint_fingerprint(sequences, model_id, long_mode))
+
+
+def iter_embed_sequences(file_name: str, sequences: List[str], output_path: str, batch_size: int = 32,
+                         max_tokens: Optional[int] = 16384, model_name: str = DEFAULT_MODEL,
+                         device: Optional[str] = None, dtype: str = "fp32", cache_dir: Optional[str] = None,
+                         stats: Optional[dict] = None, long_mode: bool = False):
+    """
+    Streaming embedding with a resumable on-disk checkpoint
+    
+    Every finished batch is appended to <stem>-<fingerprint>_embeddings.partial/ before it is
+    yielded. A restarted job with the same inputs first yields the batches restored from the
+    checkpoint, then continues with the remaining sequences. The caller removes the checkpoint
+    (remove_checkpoint(job_checkpoint_dir(...))) once the final output is saved.
+    
+    Args:
+        sequences: list of protein sequences
+        output_path: directory prefix holding the checkpoint
+        batch_size, max_tokens, model_name, device, dtype, cache_dir, long_mode: see embed_sequences
+        stats: optional dict filled with iter_encode counts once the generator is exhausted
+        
+    Yields:
+        (original indices, float32 matrix [len(indices), embedding_dim])
+    """
+    embedder = get_embedder(model_name, device, dtype)
+    cache = open_cache(cache_dir) if cache_dir else None
+    fingerprint = _checkpoint_fingerprint(sequences, embedder.model_id, long_mode)
+    checkpoint = EmbeddingCheckpoint(checkpoint_dir(file_name, output_path, fingerprint), fingerprint)
+    
+    done_indices, done_matrix = checkpoint.load()
+    if done_indices:
+        print(f"Restored {len(done_indices)} embeddings from checkpoint {checkpoint.path}")
+        yield done_indices, done_matrix
+    
+    for indices, matrix in embedder.iter_encode(sequences, batch_size=batch_size, max_tokens=max_tokens,
+                                                cache=cache, stats=stats, long_mode=long_mode,
+                                                skip=set(done_indices)):
+        checkpoint.append(indices, matrix)
+        yield indices, matrix
+
+
+def embed_sequences(file_name: str, sequences: List[str], output_path: str, batch_size: int = 32,
+                    max_tokens: Optional[int] = 16384, model_name: str = DEFAULT_MODEL,
+                    device: Optional[str] = None, dtype: str = "fp32", cache_dir: Optional[str] = None,
+                    stats: Optional[dict] = None, long_mode: bool = False, output_format: str = "pickle",
+                    output_dtype: str = "float32", locus_tags: Optional[List[str]] = None,
+                    protein_ids: Optional[List[str]] = None, poolings: Optional[List[str]] = None,
+                    num_procs: int = 1, checkpoint: bool = False, on_batch: Optional[Callable] = None,
+                    pooled: Optional[Dict[str, np.ndarray]] = None):
     """
     Convenience function to embed sequences and save to file
     
     Args:
         sequences: list of protein sequences
         output_path: path to save embeddings
-        batch_size: batch size for processing
+        batch_size: maximum sequences per batch
+        max_tokens: padded token budget per batch
+        model_name, device, dtype: resident model to use (see get_embedder)
+        cache_dir: directory of the persistent embedding cache (None: no cache)
+        stats: optional dict filled with encode_batch counts (dedup ratio, cache hits)
+        long_mode: sliding-window embedding for sequences longer than the model window
+        output_format: 'pickle' (legacy list, default), 'npy' (columnar matrix + bitmask + index) or 'both'
+        output_dtype: matrix dtype for 'npy' output ('float32' or 'float16')
+        locus_tags, protein_ids: optional row identifiers written to the npy index
+        poolings: extra poolings computed in the same forward pass (encode_multi); each is saved as
+            <stem>_embeddings_<pooling>.npy and the returned list holds the mean pooling. Uses the
+            cache; raises ValueError with long_mode or checkpoint
+        pooled: optional dict filled with the [N, D] matrix of every extra pooling (zero rows where the
+            mean embedding is None), so callers can return them with the result
+        num_procs: >1 spreads length-balanced shards over a CPU process pool (encode_sharded)
+        checkpoint: stream batches (shards with num_procs > 1) through a resumable on-disk checkpoint
+        on_batch: optional callback(indices, matrix) for partial results; called per batch on the
+            single-process paths, per finished shard with num_procs > 1 and once for poolings
         
     Returns:
-        list of embeddings
+        list of embeddings (same order as sequences)
     """
-    embedder = ESMEmbedder()
-    embeddings = embedder.encode_batch(sequences, batch_size=batch_size)
-    embedder.save_embeddings(file_name, embeddings, output_path)
+    cache = open_cache(cache_dir) if cache_dir else None
+    checkpoint_path = None
+    if poolings:
+        if long_mode or checkpoint:
+            raise ValueError("poolings cannot be combined with long_mode or checkpoint")
+        embedder = get_embedder(model_name, device, dtype)
+        names = validate_poolings(["mean"] + list(poolings))
+        matrices, valid = embedder.encode_multi(sequences, poolings=names, batch_size=batch_size,
+                                                max_tokens=max_tokens, stats=stats, cache=cache)
+        embeddings = [matrices["mean"][i][np.newaxis, :] if valid[i] else None for i in range(len(sequences))]
+        for name in names[1:]:
+            pooling_file = output_path + Path(file_name).stem + f'_embeddings_{name}.npy'
+            np.save(pooling_file, matrices[name].astype(output_dtype))
+            print(f"Saved {name} pooling to {pooling_file}")
+            if pooled is not None:
+                pooled[name] = matrices[name]
+        if on_batch is not None and valid.any():
+            on_batch(list(np.flatnonzero(valid)), matrices["mean"][valid])
+    elif num_procs > 1 and resolve_device(device) == "cpu":
+        # the model only lives in the pool children: no parent-process embedder is loaded
+        embeddings = [None] * len(sequences)
+        store = None
+        skip = set()
+        if checkpoint:
+            fingerprint = _checkpoint_fingerprint(sequences, model_identity(model_name, dtype), long_mode)
+            checkpoint_path = checkpoint_dir(file_name, output_path, fingerprint)
+            store = EmbeddingCheckpoint(checkpoint_path, fingerprint)
+            done_indices, done_matrix = store.load()
+            if done_indices:
+                print(f"Restored {len(done_indices)} embeddings from checkpoint {store.path}")
+                for idx, row in zip(done_indices, done_matrix):
+                    embeddings[idx] = row[np.newaxis, :]
+                skip = set(done_indices)
+                if on_batch is not None:
+                    on_batch(done_indices, done_matrix)
+        
+        def shard_done(indices, matrix):
+            if store is not None:
+                store.append(indices, matrix)
+            if on_batch is not None:
+                on_batch(indices, matrix)
+        
+        sharded = encode_sharded(sequences, num_procs, model_name=model_name, dtype=dtype, batch_size=batch_size,
+                                 max_tokens=max_tokens, cache_dir=cache_dir, long_mode=long_mode, stats=stats,
+                                 on_batch=shard_done, skip=skip)
+        for idx, emb in enumerate(sharded):
+            if emb is not None:
+                embeddings[idx] = emb
+    elif checkpoint:
+        checkpoint_path = job_checkpoint_dir(file_name, sequences, output_path, model_identity(model_name, dtype),
+                                             long_mode)
+        embeddings = [None] * len(sequences)
+        for indices, matrix in iter_embed_sequences(file_name, sequences, output_path, batch_size=batch_size,
+                                                    max_tokens=max_tokens, model_name=model_name, device=device,
+                                                    dtype=dtype, cache_dir=cache_dir, stats=stats,
+                                                    long_mode=long_mode):
+            for idx, row in zip(indices, matrix):
+                embeddings[idx] = row[np.newaxis, :]
+            if on_batch is not None:
+                on_batch(indices, matrix)
+    else:
+        embedder = get_embedder(model_name, device, dtype)
+        embeddings = embedder.encode_batch(sequences, batch_size=batch_size, max_tokens=max_tokens, cache=cache,
+                                          stats=stats, long_mode=long_mode, on_batch=on_batch)
+    if output_format in ("npy", "both"):
+        write_embeddings_npy(file_name, embeddings, output_path, model_name, locus_tags=locus_tags,
+                             protein_ids=protein_ids, dtype=output_dtype)
+    if output_format in ("pickle", "both"):
+        write_embeddings_pickle(file_name, embeddings, output_path)
+    if checkpoint_path is not None:
+        remove_checkpoint(checkpoint_path)
     return embeddings
@@ -0,0 +1,303 @@
+############################################
+## GBFF Ingestion Module
+## Streams CDS features (locus_tag, protein_id, product, translation, coordinates) out of
+## a plain or gzipped GenBank flat file without building whole SeqRecord objects.
+## Multi-record assemblies are parsed in parallel (byte ranges for plain files,
+## feature-table chunks for gzipped files).
+############################################
+
+import gzip
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+GBFF_SUFFIXES = ('.gbff', '.gbk', '.gb', '.genbank', '.gbff.gz', '.gbk.gz', '.gb.gz', '.genbank.gz')
+
+_LOCATION_NUMBERS = re.compile(r'\d+')
+_QUALIFIER_COLUMN = 21
+_QUALIFIER_INDENT = ' ' * _QUALIFIER_COLUMN
+# ORGANISM lines carry the strain after the species name ("Escherichia coli str. K-12 substr. MG1655")
+_STRAIN_MARKERS = re.compile(r'\s+(?:str\.|substr\.|strain|subsp\.|serovar|pv\.|bv\.)\s')
+
+
+def is_gbff(file_name: Optional[str]) -> bool:
+    return bool(file_name) and file_name.lower().endswith(GBFF_SUFFIXES)
+
+
+def is_gzipped(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+
+def open_gbff(path: str):
+    """Open a plain or gzipped GBFF file as text"""
+    if is_gzipped(path):
+        return gzip.open(path, 'rt', encoding='ascii', errors='replace')
+    return open(path, 'r', encoding='ascii', errors='replace')
+
+
+def binomial_name(organism: str) -> str:
+    """
+    Species name of a GenBank ORGANISM line, without strain designations
+
+    "Escherichia coli str. K-12 substr. MG1655" -> "Escherichia coli", so GBFF jobs search and prompt
+    with the same organism as JSON jobs; the strain comes from the source feature instead.
+    """
+    name = _STRAIN_MARKERS.split(organism.strip(), maxsplit=1)[0]
+    words = name.split()
+    keep = 3 if words and words[0] == 'Candidatus' else 2
+    return ' '.join(words[:keep])
+
+
+def parse_location(location: str) -> Tuple[int, int, int]:
+    """
+    Span of a GenBank location string
+
+    Returns:
+        (start, end, strand) with a 0-based start and exclusive end, like Biopython's FeatureLocation
+    """
+    numbers = [int(n) for n in _LOCATION_NUMBERS.findall(location)]
+    if not numbers:
+        return 0, 0, 1
+    strand = -1 if location.startswith(('complement(', 'join(complement(', 'order(complement(')) else 1
+    return min(numbers) - 1, max(numbers), strand
+
+
+def _finish_cds(record: str, location: str, qualifiers: Dict[str, str]) -> dict:
+    start, end, strand = parse_location(location)
+    translation = qualifiers.get('translation', '')
+    return {
+        "record": record,
+        "locus_tag": qualifiers.get('locus_tag', ''),
+        "protein_id": qualifiers.get('protein_id', ''),
+        "product": qualifiers.get('product', ''),
+        "translation": translation,
+        "start": start,
+        "end": end,
+        "strand": strand,
+        "length": len(translation),
+    }
+
+
+def iter_cds_lines(lines: Iterable[str], source: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Stream CDS features out of GBFF lines
+
+    Only the current feature is kept in memory; sequence (ORIGIN) lines are skipped.
+
+    Args:
+        lines: GBFF text lines (one or more records)
+        source: optional dict filled with organism (binomial) / strain / sub_strain of the first record
+
+    Yields:
+        dict per CDS (record, locus_tag, protein_id, product, translation, start, end, strand, length)
+    """
+    record = ''
+    in_features = False
+    feature_key = None
+    location = ''
+    qualifiers: Dict[str, str] = {}
+    current = None  # qualifier whose quoted value continues on the next line
+
+    for line in lines:
+        if not in_features:
+            if line.startswith('LOCUS'):
+                fields = line.split()
+                record = fields[1] if len(fields) > 1 else ''
+            elif line.startswith('VERSION'):
+                fields = line.split()
+                record = fields[1] if len(fields) > 1 else record
+            elif line.startswith('  ORGANISM') and source is not None:
+                source.setdefault('organism', binomial_name(line[12:]))
+            elif line.startswith('FEATURES'):
+                in_features = True
+            continue
+
+        if line.startswith(_QUALIFIER_INDENT):
+            if feature_key is None:
+                continue
+            text = line[_QUALIFIER_COLUMN:].rstrip('\n')
+            if current is not None:
+                # continuation of a quoted multi-line value
+                key = current
+                if text.endswith('"'):
+                    text = text[:-1]
+                    current = None
+                sep = '' if key == 'translation' else ' '
+                qualifiers[key] = qualifiers[key] + sep + text
+            elif text.startswith('/'):
+                key, eq, value = text[1:].partition('=')
+                if eq and value.startswith('"'):
+                    value = value[1:]
+                    if value.endswith('"'):
+                        value = value[:-1]
+                    else:
+                        current = key
+                if key not in qualifiers:
+                    qualifiers[key] = value
+            elif not qualifiers:
+                location += text.strip()
+            continue
+
+        # a new feature, or the end of the feature table
+        if feature_key == 'CDS':
+            yield _finish_cds(record, location, qualifiers)
+        elif feature_key == 'source' and source is not None:
+            for key in ('strain', 'sub_strain'):
+                if key in qualifiers:
+                    source.setdefault(key, qualifiers[key])
+        feature_key, location, qualifiers, current = None, '', {}, None
+
+        if line.startswith('     ') and len(line) > 5 and line[5] != ' ':
+            feature_key = line[5:_QUALIFIER_COLUMN].strip()
+            location = line[_QUALIFIER_COLUMN:].strip()
+        elif not line.startswith(' '):
+            # ORIGIN / CONTIG / '//' end the feature table of this record
+            in_features = False
+
+    if feature_key == 'CDS':
+        yield _finish_cds(record, location, qualifiers)
+
+
+def iter_cds(path: str, source: Optional[dict] = None) -> Iterator[dict]:
+    """Stream CDS features of a plain or gzipped GBFF file in one process"""
+    with open_gbff(path) as f:
+        yield from iter_cds_lines(f, source)
+
+
+def record_ranges(path: str, chunk_bytes: int = 1 << 20) -> List[Tuple[int, int]]:
+    """
+    Split a plain GBFF file into byte ranges that start at record boundaries
+
+    Records are grouped so each range is at least chunk_bytes long (a small assembly is one range).
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            if f.tell() < size:
+                f.readline()  # move to a line boundary
+            end = size
+            while True:
+                pos = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if line.startswith(b'LOCUS'):
+                    end = pos
+                    break
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _iter_range_lines(path: str, start: int, end: int) -> Iterator[str]:
+    """Lines of the byte range [start, end) of a plain file"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line.decode('ascii', errors='replace')
+
+
+def _parse_range(args) -> List[dict]:
+    path, start, end = args
+    return list(iter_cds_lines(_iter_range_lines(path, start, end)))
+
+
+def _parse_text(text: str) -> List[dict]:
+    return list(iter_cds_lines(text.splitlines(True)))
+
+
+def _feature_chunks(lines: Iterable[str], chunk_bytes: int) -> Iterator[str]:
+    """Group whole records into text chunks, dropping sequence lines (ORIGIN .. //)"""
+    buffer: List[str] = []
+    size = 0
+    in_sequence = False
+    for line in lines:
+        if line.startswith('//'):
+            in_sequence = False
+            buffer.append(line)
+            if size >= chunk_bytes:
+                yield ''.join(buffer)
+                buffer, size = [], 0
+            continue
+        if in_sequence:
+            continue
+        if line.startswith('ORIGIN'):
+            in_sequence = True
+        buffer.append(line)
+        size += len(line)
+    if buffer:
+        yield ''.join(buffer)
+
+
+def parse_gbff(path: str, num_procs: Optional[int] = None, chunk_bytes: int = 1 << 20,
+               source: Optional[dict] = None) -> List[dict]:
+    """
+    Extract every CDS of a GBFF file, parsing multi-record files in parallel
+
+    Args:
+        path: plain or gzipped GBFF file
+        num_procs: worker processes (None: os.cpu_count(); 1: stream in this process)
+        chunk_bytes: minimum amount of GBFF text handed to one worker task
+        source: optional dict filled with organism / strain / sub_strain
+
+    Returns:
+        CDS dicts in file order
+    """
+    num_procs = num_procs or os.cpu_count() or 1
+    if source is not None:
+        # organism / strain come from the head of the first record
+        with open_gbff(path) as f:
+            for _ in iter_cds_lines(f, source):
+                break
+
+    if num_procs <= 1:
+        return list(iter_cds(path))
+    ranges = None if is_gzipped(path) else record_ranges(path, chunk_bytes)
+    if ranges is not None and len(ranges) <= 1:
+        return list(iter_cds(path))
+
+    cds = []
+    # spawned workers: the handler process already holds torch and running threads, which fork would copy
+    with ProcessPoolExecutor(max_workers=num_procs, mp_context=multiprocessing.get_context("spawn")) as executor:
+        if ranges is not None:
+            parts = executor.map(_parse_range, [(path, start, end) for start, end in ranges])
+        else:
+            # gzip cannot be split by offset: decompress here, parse feature tables in workers
+            with open_gbff(path) as f:
+                parts = list(executor.map(_parse_text, _feature_chunks(f, chunk_bytes)))
+        for part in parts:
+            cds.extend(part)
+    return cds
+
+
+def load_gbff_input(path: str, num_procs: Optional[int] = None) -> dict:
+    """
+    Handler input fields extracted from a GBFF file
+
+    Returns:
+        dict with products, translations, locus_tags, protein_ids, coordinates and, when the file
+        declares them, organism / strain / sub_strain
+    """
+    source: Dict[str, str] = {}
+    cds = parse_gbff(path, num_procs=num_procs, source=source)
+    print(f"Parsed {len(cds)} CDS features from {path}")
+    data = {
+        "products": [c["product"] for c in cds],
+        "translations": [c["translation"] for c in cds],
+        "locus_tags": [c["locus_tag"] for c in cds],
+        "protein_ids": [c["protein_id"] for c in cds],
+        "coordinates": [[c["record"], c["start"], c["end"], c["strand"]] for c in cds],
+    }
+    data.update(source)
+    return data
@@ -1,12 +1,20 @@
 import ollama
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import json
 import time
 import re
+import threading
 import requests
 import html
 from collections import defaultdict
 import urllib3
+import httpx
+
+from main.llm_cache import LLMCache, open_llm_cache
+from main.pipeline import ResourceGate
+from main.retry import CircuitBreaker, RetryPolicy
 
 
 ########################################################################
@@ -757,43 +765,148 @@ import json
 
 
 
+# JSON schema passed as Ollama's `format` so the model can only answer {"tags": [...]}
+TAGS_SCHEMA = {
+    "type": "object",
+    "properties": {"tags": {"type": "array", "items": {"type": "string"}}},
+    "required": ["tags"],
+}
+
+_JSON_DECODER = json.JSONDecoder()
+# Entries of the example object in the prompt's OUTPUT FORMAT ({"tags": ["tag1", "tag2", "..."]})
+_PLACEHOLDER_TAG = re.compile(r'^(tag\s*\d*|\.\.\.|…)$', re.IGNORECASE)
+
+
+def _find_tags(obj):
+    """The 'tags' value of the first dict (depth-first) that has one, else None"""
+    if isinstance(obj, dict):
+        if 'tags' in obj:
+            return obj['tags']
+        children = obj.values()
+    elif isinstance(obj, list):
+        children = obj
+    else:
+        return None
+    for child in children:
+        found = _find_tags(child)
+        if found is not None:
+            return found
+    return None
+
+
+def _clean_tags(raw_tags):
+    """Strip, drop empty and case-insensitively deduplicate tags"""
+    if not isinstance(raw_tags, list):
+        print(f"Warning: 'tags' is not a list: {type(raw_tags)}")
+        return []
+    tags = []
+    seen = set()
+    for t in raw_tags:
+        if not t:  # Skip empty
+            continue
+        tag_str = str(t).strip()
+        if not tag_str:
+            continue
+        key = tag_str.lower()
+        if key not in seen:
+            seen.add(key)
+            tags.append(tag_str)
+    return tags
+
+
+def _is_placeholder(tags):
+    """True for the prompt's example tag list echoed back by the model"""
+    return bool(tags) and all(_PLACEHOLDER_TAG.match(tag) for tag in tags)
+
+
+def _scan_tags(text):
+    """
+    (tags, end offset of the object they came from) for parse_tags; tags is None if no object has any
+
+    Copies of the prompt's example object (only placeholder tags) are skipped. Of the rest, the first
+    object with a non-empty tag list wins; otherwise the last object carrying 'tags' (e.g. an empty
+    list). An example echoed from the prompt therefore cannot hide the real answer.
+    """
+    try:
+        found = _find_tags(json.loads(text))
+        if found is not None:
+            tags = _clean_tags(found)
+            return (None, 0) if _is_placeholder(tags) else (tags, len(text))
+    except ValueError:
+        pass
+
+    # scan every '{' for a complete JSON value that carries 'tags'
+    last = (None, 0)
+    start = text.find('{')
+    while start != -1:
+        try:
+            obj, end = _JSON_DECODER.raw_decode(text, start)
+        except ValueError:
+            start = text.find('{', start + 1)
+            continue
+        found = _find_tags(obj)
+        if found is not None:
+            tags = _clean_tags(found)
+            if _is_placeholder(tags):
+                pass
+            elif tags:
+                return tags, end
+            else:
+                last = (tags, end)
+        start = text.find('{', end)
+    return last
+
+
 def parse_tags(response_text):
-    """Parse response with strict JSON parsing and robust fallback."""
-    text = response_text.strip()
-
-    # Try to find JSON object in the text
-    json_match = re.search(r'\{[^}]*"tags"\s*:\s*\[[^\]]*\][^}]*\}', text, re.DOTALL)
-    if json_match:
-        text = json_match.group(0)
-    
-    # Attempt JSON parsing
-    obj = json.loads(text)
-    if isinstance(obj, dict) and 'tags' in obj:
-        raw_tags = obj['tags']
-        if not isinstance(raw_tags, list):
-            print(f"Warning: 'tags' is not a list: {type(raw_tags)}")
-            return []
-        
-        # Clean and deduplicate tags
-        tags = []
-        seen = set()
-        for t in raw_tags:
-            if not t:  # Skip empty
-                continue
-            tag_str = str(t).strip()
-            if not tag_str:
-                continue
-            key = tag_str.lower()
-            if key not in seen:
-                seen.add(key)
-                tags.append(tag_str)
-        return tags
+    """
+    Extract the tag list from an LLM answer
+
+    Accepts plain JSON (structured output) as well as JSON embedded in free text or code fences,
+    including objects with nested braces. With several objects the first non-empty tag list wins,
+    ignoring copies of the prompt's example object.
+    Returns None when no {"tags": ...} object is present.
+    """
+    return _scan_tags(response_text.strip())[0]
+
+
+class TagStreamParser:
+    """
+    Incremental parse_tags over a streamed answer; reports tags as soon as a non-empty tag list is complete
+
+    An empty list is only accepted by close(), since a later object may still carry the real tags.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.tags = None
+        self.end = None
+
+    def feed(self, text):
+        """Add a streamed piece of the answer; returns the tags once they are available"""
+        if self.tags is None:
+            self.buffer += text
+            # an object can only become complete when a closing brace arrives
+            if '}' in text:
+                tags, end = _scan_tags(self.buffer)
+                if tags:
+                    self.tags, self.end = tags, end
+        return self.tags
+
+    @property
+    def trailing(self):
+        """Non-whitespace text received after the object the tags came from"""
+        return self.buffer[self.end:].strip() if self.end is not None else ''
+
+    def close(self):
+        """Final parse of the whole answer"""
+        if self.tags is None:
+            self.tags = parse_tags(self.buffer)
+        return self.tags
     
 #############################################################################
 
-def searching_tags(organism, strain, sub_strain, num_abstracts=10, num_fulltexts=5, max_corpus_chars=15000):
-    
-    model = 'kronos483/Llama-3.2-3B-PubMed:latest'
+def searching_tags(organism, strain, sub_strain, num_abstracts=10, num_fulltexts=5, max_corpus_chars=15000,
+                   cache=None, policy=None, stats=None, usage=None):
 
     substr = " substr. ".join([strain, sub_strain])
 
@@ -809,28 +922,22 @@ def searching_tags(organism, strain, sub_strain, num_abstracts=10, num_fulltexts
     prompt = prompt_generation(organism, substr, result['corpus'])
     print('Prompt Generated:')
     print(prompt)
+    if policy is None:
+        policy = make_retry_policy()
     tag_list = []
+    failed_draws = 0
     for i in range(3):
-        n = 0
-        while n <= 5:    
-            try:
-                response = ollama.chat(model = model, messages = [{
-                'role':'user',
-                'content': prompt
-                }])
-                tags = parse_tags(response['message']['content'])
-                
-                if len(tags) > 0:
-                    tag_list.append(tags)
-                    print(f'Response Received:{tags}')
-                    break
-                else:
-                    n += 1
-                    continue
-            except Exception as e:
-                n += 1
-                print(f"Error during chat or parsing: {e}")
-                print("Retrying...")
+        try:
+            # each of the 3 draws is cached under its own sample index
+            _, tags, _ = policy.call(chat_tags, prompt, cache=cache, sample=i, require_tags=True, usage=usage,
+                                     on_error=lambda e: print(f"Error during chat or parsing: {e}\nRetrying..."))
+            tag_list.append(tags)
+            print(f'Response Received:{tags}')
+        except Exception as e:
+            failed_draws += 1
+            print(f"Giving up on draw {i + 1}: {e}")
+    if stats is not None:
+        stats['search_failed_draws'] = failed_draws
 
 
     tags_flat = []
@@ -858,12 +965,179 @@ def searching_tags(organism, strain, sub_strain, num_abstracts=10, num_fulltexts
 ####################################################################
 
 model = 'kronos483/Llama-3.2-3B-PubMed:latest'
+# Sampling options sent with every request (part of the LLM cache key)
+LLM_OPTIONS = None
+# Disk-backed LLM response cache shared by all jobs of this worker
+LLM_CACHE_DIR = os.environ.get('LLM_CACHE_DIR', 'temp/llm_cache')
+# Constrain answers to TAGS_SCHEMA via Ollama's `format` (0: free-form text, parsed by parse_tags)
+STRUCTURED_OUTPUT = os.environ.get('LLM_STRUCTURED', '1') == '1'
+# Retry policy of LLM calls: attempts per call, and failed attempts / seconds per job before giving up
+LLM_RETRY_ATTEMPTS = int(os.environ.get('LLM_RETRY_ATTEMPTS', '5'))
+LLM_JOB_RETRY_BUDGET = int(os.environ.get('LLM_JOB_RETRY_BUDGET', '50'))
+LLM_JOB_TIME_BUDGET = float(os.environ.get('LLM_JOB_TIME_BUDGET', '1800'))
+# Shared by every job of the worker: stop calling Ollama for a while after repeated transport failures
+OLLAMA_BREAKER = CircuitBreaker('ollama', failure_threshold=int(os.environ.get('LLM_BREAKER_THRESHOLD', '5')),
+                                reset_timeout=float(os.environ.get('LLM_BREAKER_RESET', '30')))
+# Seconds without progress (connect / next streamed chunk) before an Ollama request fails; a hung server
+# then counts as a breaker failure instead of blocking the job past its retry time budget
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', '120'))
+OLLAMA_CLIENT = ollama.Client(host=os.environ.get('OLLAMA_HOST'), timeout=LLM_TIMEOUT)
+# Product chunks one job dispatches at once
+MAX_INFLIGHT = int(os.environ.get('OLLAMA_MAX_INFLIGHT', '4'))
+# Requests the worker sends to the Ollama server at once across all jobs (match the server's
+# OLLAMA_NUM_PARALLEL); held per request, so its queue depth is the real LLM queue depth
+LLM_GATE = ResourceGate('llm', int(os.environ.get('OLLAMA_NUM_PARALLEL', '4')))
+
+# Token budget of one tag prompt (template + products), measured with the model's tokenizer;
+# leaves room for the answer inside Ollama's default 2048-token context
+LLM_PROMPT_TOKENS = int(os.environ.get('LLM_PROMPT_TOKENS', '1536'))
+# Optional HuggingFace tokenizer repo matching the served Ollama model, used to measure prompts exactly.
+# Off by default: prompts are then measured as one token per 3 characters, which overestimates
+# Llama-family tokenizers on annotation text, so packed prompts stay within the budget
+LLM_TOKENIZER = os.environ.get('LLM_TOKENIZER', '')
+# Drop products that carry no functional information before prompting
+DROP_UNINFORMATIVE = os.environ.get('LLM_DROP_UNINFORMATIVE', '1') == '1'
+
+# e.g. "hypothetical protein", "putative uncharacterized protein YbaB", "protein of unknown function"
+UNINFORMATIVE_PRODUCT = re.compile(
+    r'^((conserved|putative|predicted|probable)\s+)*'
+    r'(hypothetical|uncharacteri[sz]ed|unknown)(\s+conserved)?\s+protein(\s+\S+)?$'
+    r'|^(protein|domain|gene)\s+of\s+unknown\s+function(\s+\S+)?$'
+    r'|^(unknown|hypothetical|uncharacteri[sz]ed)$',
+    re.IGNORECASE
+)
+
+_token_counter = None
+_token_counter_lock = threading.Lock()
+
+
+def get_token_counter():
+    """
+    Token counter of the tagging model (loaded once per worker)
+
+    Uses the HuggingFace tokenizer named by LLM_TOKENIZER when set; otherwise, or when it cannot be
+    loaded, a conservative estimate of one token per 3 characters.
+
+    Returns:
+        (count_tokens(text) -> int, tokenizer name)
+    """
+    global _token_counter
+    with _token_counter_lock:
+        if _token_counter is None:
+            _token_counter = (lambda text: len(text) // 3 + 1, 'chars/3')
+            if LLM_TOKENIZER:
+                try:
+                    from transformers import AutoTokenizer
+                    tokenizer = AutoTokenizer.from_pretrained(LLM_TOKENIZER)
+                    _token_counter = (lambda text: len(tokenizer.encode(text, add_special_tokens=False)),
+                                      LLM_TOKENIZER)
+                except Exception as e:
+                    print(f'Could not load tokenizer {LLM_TOKENIZER} ({e}); estimating 3 characters per token')
+        return _token_counter
+
 
 def chunk_products(products, chunk_size=100):
     """Split products into chunks of specified size"""
     for i in range(0, len(products), chunk_size):
         yield products[i:i + chunk_size]
 
+
+def prepare_products(products, drop_uninformative=None, stats=None):
+    """
+    Normalize product annotations for prompting
+
+    Collapses whitespace, drops empty strings, removes case-insensitive duplicates (first spelling
+    and genome order kept) and, with drop_uninformative, products matching UNINFORMATIVE_PRODUCT.
+
+    Args:
+        products: product annotation strings
+        drop_uninformative: default DROP_UNINFORMATIVE
+        stats: optional dict filled with input / kept / duplicate / uninformative counts
+
+    Returns:
+        list of distinct products
+    """
+    if drop_uninformative is None:
+        drop_uninformative = DROP_UNINFORMATIVE
+    kept = []
+    seen = set()
+    duplicates = 0
+    uninformative = 0
+    for product in products:
+        product = ' '.join(str(product or '').split())
+        if not product:
+            continue
+        if drop_uninformative and UNINFORMATIVE_PRODUCT.match(product):
+            uninformative += 1
+            continue
+        key = product.lower()
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        kept.append(product)
+    if stats is not None:
+        stats.update({"products_in": len(products), "products_kept": len(kept),
+                      "duplicates_dropped": duplicates, "uninformative_dropped": uninformative})
+    return kept
+
+
+def pack_products(products, token_budget=None, count_tokens=None, max_products=None):
+    """
+    Pack products into as few prompts as possible without exceeding the token budget
+
+    Products are packed greedily in order; each chunk's full prompt (prompt_gen_tags) is measured
+    and shrunk if tokenization across line boundaries pushed it over the budget. A single product
+    too long for the budget still gets its own chunk (never truncated).
+
+    Args:
+        products: product strings (see prepare_products)
+        token_budget: prompt token budget (default LLM_PROMPT_TOKENS)
+        count_tokens: callable text -> token count (default: get_token_counter())
+        max_products: optional cap of products per chunk
+
+    Returns:
+        list of chunks (lists of products)
+    """
+    if token_budget is None:
+        token_budget = LLM_PROMPT_TOKENS
+    if count_tokens is None:
+        count_tokens, _ = get_token_counter()
+    base = count_tokens(prompt_gen_tags([]))
+    if base >= token_budget:
+        raise ValueError(f"Token budget {token_budget} is smaller than the prompt template ({base} tokens)")
+
+    chunks = []
+    chunk, used = [], base
+    for product in products:
+        cost = count_tokens(product + '\n')
+        full = max_products is not None and len(chunk) >= max_products
+        if chunk and (used + cost > token_budget or full):
+            chunks.append(chunk)
+            chunk, used = [], base
+        chunk.append(product)
+        used += cost
+    if chunk:
+        chunks.append(chunk)
+
+    packed = []
+    pending = list(reversed(chunks))
+    while pending:
+        chunk = pending.pop()
+        if len(chunk) > 1 and count_tokens(prompt_gen_tags(chunk)) > token_budget:
+            # per-line estimate was slightly low: move the last product to the next chunk,
+            # or to a chunk of its own when the next one is already at max_products
+            if pending and (max_products is None or len(pending[-1]) < max_products):
+                pending[-1] = chunk[-1:] + pending[-1]
+            else:
+                pending.append(chunk[-1:])
+            pending.append(chunk[:-1])
+            continue
+        if len(chunk) == 1 and count_tokens(prompt_gen_tags(chunk)) > token_budget:
+            print(f'Warning: product longer than the prompt budget sent alone: {chunk[0][:80]}')
+        packed.append(chunk)
+    return packed
+
 def prompt_gen_tags(products_chunk):
     products_str = "\n".join(products_chunk)
     prompt = f"""
@@ -894,42 +1168,203 @@ Return only valid JSON and nothing else.
 """
     return prompt
 
-def parse_tags(response_text):
-    """Parse response with strict JSON parsing and robust fallback."""
-    text = response_text.strip()
-
-    # Try to find JSON object in the text
-    json_match = re.search(r'\{[^}]*"tags"\s*:\s*\[[^\]]*\][^}]*\}', text, re.DOTALL)
-    if json_match:
-        text = json_match.group(0)
-    
-    # Attempt JSON parsing
-    obj = json.loads(text)
-    if isinstance(obj, dict) and 'tags' in obj:
-        raw_tags = obj['tags']
-        if not isinstance(raw_tags, list):
-            print(f"Warning: 'tags' is not a list: {type(raw_tags)}")
-            return []
-        
-        # Clean and deduplicate tags
-        tags = []
-        seen = set()
-        for t in raw_tags:
-            if not t:  # Skip empty
-                continue
-            tag_str = str(t).strip()
-            if not tag_str:
-                continue
-            key = tag_str.lower()
-            if key not in seen:
-                seen.add(key)
-                tags.append(tag_str)
-        return tags
+class LLMUsage:
+    """Per-job LLM call counters (shared by the chunk threads of one job)"""
+
+    def __init__(self, structured=None):
+        self.structured = STRUCTURED_OUTPUT if structured is None else structured
+        self.calls = 0
+        self.cache_hits = 0
+        self.parse_failures = 0
+        self.stopped_early = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def stats(self):
+        return {
+            "structured_output": self.structured,
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            # every parse failure is one extra LLM round trip
+            "parse_failures": self.parse_failures,
+            "stopped_early": self.stopped_early,
+        }
+
+
+def chat_tags(prompt, cache=None, sample=0, require_tags=False, usage=None):
+    """
+    One LLM call parsed into tags, served from the LLM cache when possible
+
+    With structured output the request carries TAGS_SCHEMA as Ollama's `format`. The answer is
+    streamed through TagStreamParser; the stream is only cut short (stopped_early) when the model
+    keeps writing after a complete tag object. A server that stops responding for LLM_TIMEOUT
+    seconds raises TimeoutError.
+    Only parsable responses are cached; with require_tags an empty tag list counts as a failure.
+
+    Returns:
+        (raw_response, tags, cache_hit)
+    """
+    if usage is None:
+        usage = LLMUsage()
+    fmt = TAGS_SCHEMA if usage.structured else None
+    key = LLMCache.make_key(model, prompt, {"options": LLM_OPTIONS, "format": fmt}, sample) if cache is not None else None
+    if cache is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            usage.add(cache_hits=1)
+            return hit[0], hit[1], True
+
+    usage.add(calls=1)
+    parser = TagStreamParser()
+    tags = None
+    # only the request itself holds an LLM slot (not cache lookups or retry backoff)
+    with LLM_GATE.slot():
+        try:
+            stream = OLLAMA_CLIENT.chat(model=model, messages=[{
+                'role': 'user', 
+                'content': prompt
+            }], options=LLM_OPTIONS, format=fmt, stream=True)
+            for part in stream:
+                content = part['message']['content']
+                if tags is not None and content.strip():
+                    # the model keeps talking after a complete answer: skip the rest of the stream
+                    usage.add(stopped_early=1)
+                    break
+                tags = parser.feed(content)
+                if tags is not None and parser.trailing:
+                    usage.add(stopped_early=1)
+                    break
+        except httpx.TimeoutException as e:
+            # not a ValueError, so the retry policy counts it against OLLAMA_BREAKER
+            raise TimeoutError(f"Ollama did not respond within {LLM_TIMEOUT}s: {e!r}") from e
+        if hasattr(stream, 'close'):
+            stream.close()
+    raw_response = parser.buffer
+    if tags is None:
+        tags = parser.close()
+    if tags is None:
+        usage.add(parse_failures=1)
+        raise ValueError("Response has no 'tags' list")
+    if require_tags and not tags:
+        raise ValueError("Response has an empty 'tags' list")
+    if cache is not None:
+        cache.put(key, raw_response, tags)
+    return raw_response, tags, False
+
+
+def make_retry_policy():
+    """Fresh per-job retry policy on the shared Ollama circuit breaker"""
+    return RetryPolicy(max_attempts=LLM_RETRY_ATTEMPTS, base_delay=1.0, max_delay=30.0,
+                       budget_attempts=LLM_JOB_RETRY_BUDGET, budget_seconds=LLM_JOB_TIME_BUDGET,
+                       breaker=OLLAMA_BREAKER)
+
+
+def llm_cache_stats():
+    """Hit/miss counters of this worker's LLM response cache"""
+    return open_llm_cache(LLM_CACHE_DIR).stats()
+
+
+def tag_chunk(chunk, cache=None, policy=None, usage=None):
+    """
+    Ask the LLM for the tags of one product chunk, retrying under the job's retry policy
+
+    Returns:
+        (raw_response, tags, errors of the failed attempts); raw_response and tags are None when
+        the policy gave up (degraded chunk)
+    """
+    if policy is None:
+        policy = make_retry_policy()
+    errors = []
+    try:
+        raw_response, tags, _ = policy.call(chat_tags, prompt_gen_tags(chunk), cache=cache, usage=usage,
+                                            on_error=lambda e: errors.append(str(e)))
+        return raw_response, tags, errors
+    except Exception as e:
+        errors.append(f"Gave up: {e}")
+        return None, None, errors
+
+
+def tag_products(products, output_log, chunk_size=100, max_inflight=4, on_chunk=None, cache=None, policy=None,
+                 usage=None, chunks=None):
+    """
+    Tag all product chunks, keeping up to max_inflight LLM requests in flight
+
+    Chunks finish in any order but are logged, reported to on_chunk and concatenated in chunk order,
+    so the log and tag list do not depend on scheduling.
+    chunks: pre-built chunks (e.g. from pack_products); products and chunk_size are then ignored
+
+    Returns:
+        (list of tags in chunk order, not deduplicated; numbers of degraded chunks that produced no tags)
+    """
+    if policy is None:
+        policy = make_retry_policy()
+    if chunks is None:
+        chunks = list(chunk_products(products, chunk_size=chunk_size))
+    n_chunks = len(chunks)
+    tags = []
+    degraded = []
+    done = {}
+    next_idx = 0
+
+    def flush():
+        # write every finished chunk that is next in order
+        nonlocal next_idx, tags
+        while next_idx in done:
+            raw_response, tag, errors = done.pop(next_idx)
+            with open(output_log, 'a') as f:
+                for error in errors:
+                    f.write('\n' + error + '\n')
+                    f.write('\nRetrying..\n')
+                if tag is None:
+                    f.write(f"\n\nChunk {next_idx + 1} degraded: no tags collected\n\n")
+                    f.write('----------------------------------------\n')
+                    degraded.append(next_idx + 1)
+                    tag = []
+                    next_idx += 1
+                    if on_chunk is not None:
+                        on_chunk(next_idx, n_chunks, tag)
+                    continue
+                f.write(f"Raw_response: \n{raw_response}\n")
+                tag_lines = '\n'.join(tag)
+                f.write(f"\nParsed tags: \n[{tag_lines}]\n")
+                f.write(f"\n\nChunk {next_idx + 1} processed: {len(tag)}tags collected\n\n")
+                f.write('----------------------------------------\n')
+            tags += tag
+            if on_chunk is not None:
+                on_chunk(next_idx + 1, n_chunks, tag)
+            next_idx += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, max_inflight)) as executor:
+        futures = {}
+        for idx, chunk in enumerate(chunks):
+            print(f'[{time.strftime("%Y-%m-%d %H:%M:%S")}]Dispatching chunk {idx + 1} / {n_chunks} with {len(chunk)} products')
+            futures[executor.submit(tag_chunk, chunk, cache, policy, usage)] = idx
+        for future in as_completed(futures):
+            done[futures[future]] = future.result()
+            flush()
+
+    return tags, degraded
 
 
 ## Final function
 
-def collect_tags(file_name, products, organism, strain, sub_strain, output_dir, chunk_size=100):
+def collect_tags(file_name, products, organism, strain, sub_strain, output_dir, chunk_size=None, on_chunk=None,
+                 max_inflight=None, use_llm_cache=True, stats=None, token_budget=None, drop_uninformative=None):
+    """
+    Generate functional tags for a genome from its product annotations and a literature search
+
+    Products are normalized and deduplicated (prepare_products), then packed into prompts of up to
+    token_budget tokens (default LLM_PROMPT_TOKENS); chunk_size additionally caps products per chunk.
+    on_chunk: optional callback(chunk_number, n_chunks, chunk_tags) called as each LLM chunk finishes
+    max_inflight: concurrent LLM chunk requests of this job (default: OLLAMA_MAX_INFLIGHT or 4); LLM_GATE
+        bounds the requests of all jobs together
+    use_llm_cache: reuse cached responses for identical prompts (False: always sample fresh answers)
+    stats: optional dict filled with degraded chunks, failed search draws and retry counts
+    """
     print(f'request confirmed: generating tags for {file_name} with {len(products)} products')
     output_log = output_dir + Path(file_name).stem + '_log.txt'
     output_file = output_dir + Path(file_name).stem + '_tags.txt'
@@ -940,30 +1375,27 @@ def collect_tags(file_name, products, organism, strain, sub_strain, output_dir,
         # f.write(f'products: "{"\n".join(products)}"\n')
     print(f'Log file initialized at {output_log}')
 
-    tags = []
-    for idx, chunk in enumerate(chunk_products(products, chunk_size=chunk_size)):
-        print(f'[{time.strftime("%Y-%m-%d %H:%M:%S")}]Processing chunk {idx + 1} / {((len(products)-1)//chunk_size)+1} with {len(chunk)} products')
-        while True:
-            try:
-                response = ollama.chat(model=model, messages=[{
-                    'role': 'user', 
-                    'content': prompt_gen_tags(chunk)
-                }])
-                
-                raw_response = response['message']['content']
-                tag = parse_tags(raw_response)
-                tags += tag
-                with open(output_log, 'a') as f:
-                    f.write(f"Raw_response: \n{raw_response}\n")
-                    f.write(f"\nParsed tags: \n[{'\n'.join(tag)}]\n")
-                    f.write(f"\n\nChunk {idx + 1} processed: {len(tag)}tags collected\n\n")
-                    f.write('----------------------------------------\n')
-                break
-            except Exception as e:
-                with open(output_log, 'a') as f:
-                    f.write('\n' + str(e) + '\n')
-                    f.write('\nRetrying..\n')
-        
+    if max_inflight is None:
+        max_inflight = MAX_INFLIGHT
+    product_stats = {}
+    count_tokens, tokenizer_name = get_token_counter()
+    chunks = pack_products(prepare_products(products, drop_uninformative=drop_uninformative, stats=product_stats),
+                           token_budget=token_budget, count_tokens=count_tokens, max_products=chunk_size)
+    prompt_tokens = [count_tokens(prompt_gen_tags(chunk)) for chunk in chunks]
+    product_stats.update({"tokenizer": tokenizer_name, "token_budget": token_budget or LLM_PROMPT_TOKENS,
+                          "max_prompt_tokens": max(prompt_tokens, default=0),
+                          "mean_prompt_tokens": round(sum(prompt_tokens) / len(prompt_tokens), 1) if chunks else 0})
+    print(f'{product_stats["products_kept"]} / {len(products)} products kept '
+          f'({product_stats["duplicates_dropped"]} duplicates, {product_stats["uninformative_dropped"]} uninformative), '
+          f'packed into {len(chunks)} chunks of <= {product_stats["token_budget"]} prompt tokens')
+    with open(output_log, 'a') as f:
+        f.write(f'Products after dedup: {product_stats["products_kept"]}, chunks: {len(chunks)}\n')
+
+    cache = open_llm_cache(LLM_CACHE_DIR) if use_llm_cache else None
+    policy = make_retry_policy()
+    usage = LLMUsage()
+    tags, degraded = tag_products(products, output_log, max_inflight=max_inflight, on_chunk=on_chunk,
+                                  cache=cache, policy=policy, usage=usage, chunks=chunks)
 
     # Deduplicate tags case-insensitively while preserving original case
     unique_tags = []
@@ -976,7 +1408,23 @@ def collect_tags(file_name, products, organism, strain, sub_strain, output_dir,
     
     anot_tags = unique_tags
 
-    ser_tags = searching_tags(organism, strain, sub_strain)
+    search_stats = {}
+    ser_tags = searching_tags(organism, strain, sub_strain, cache=cache, policy=policy, stats=search_stats,
+                              usage=usage)
+    if stats is not None:
+        stats.update({
+            "chunks": len(chunks),
+            "products": product_stats,
+            "degraded_chunks": degraded,
+            "search_failed_draws": search_stats.get('search_failed_draws', 0),
+            "degraded": bool(degraded) or search_stats.get('search_failed_draws', 0) > 0,
+            "retry": policy.stats(),
+            "llm": usage.stats(),
+        })
+    if degraded:
+        print(f'Warning: {len(degraded)} chunks degraded (no tags): {degraded}')
+    if cache is not None:
+        print(f'LLM cache stats: {cache.stats()}')
 
     conc_tags = anot_tags + ser_tags
 
@@ -0,0 +1,174 @@
+############################################
+## Job Cache Module
+## Whole-job result cache: a resubmitted genome with identical input and model versions
+## returns the stored response instead of rerunning tagging and embedding
+## Key: sha256(canonical handler input, model versions)
+## Value: response JSON + the result-store artifacts it references (evicted together);
+## artifacts of uncached results are tracked too, so every artifact is eventually deleted
+############################################
+
+import hashlib
+import json
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from main.sqlite_lru import SqliteLRU
+
+# Bump when the response layout or pipeline semantics change so old entries stop matching
+JOB_CACHE_VERSION = 1
+
+# Input fields that control caching itself and do not change the result
+_NON_SEMANTIC_FIELDS = ("use_cache",)
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Content hash of an input file (e.g. a GBFF referenced only by file_name)"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def canonical_hash(job_input: dict, versions: Dict[str, str]) -> str:
+    """
+    Canonical content hash of a job
+
+    Args:
+        job_input: handler input dict
+        versions: model / file versions the result depends on
+
+    Returns:
+        hex sha256 digest (key order and whitespace do not matter)
+    """
+    payload = {k: v for k, v in job_input.items() if k not in _NON_SEMANTIC_FIELDS}
+    text = json.dumps({"input": payload, "versions": versions, "cache_version": JOB_CACHE_VERSION},
+                      sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class JobCache(SqliteLRU):
+    """SQLite index of finished job responses with TTL and size-based LRU eviction"""
+
+    db_file = "jobs.sqlite"
+    table = "jobs"
+    columns = ("key TEXT PRIMARY KEY", "response TEXT NOT NULL", "artifacts TEXT NOT NULL", "nbytes INTEGER NOT NULL",
+               "created REAL NOT NULL", "last_access REAL NOT NULL")
+    index_name = "idx_jobs_last_access"
+
+    def __init__(self, cache_dir: str, store=None, ttl_seconds: float = 7 * 24 * 3600,
+                 max_bytes: int = 5 * 1024**3):
+        """
+        Open (or create) the job cache
+
+        Args:
+            cache_dir: directory holding jobs.sqlite
+            store: result store holding the referenced artifacts (deleted on eviction)
+            ttl_seconds: entries older than this are dropped on lookup
+            max_bytes: total response + artifact size before least-recently-used jobs are evicted
+        """
+        super().__init__(cache_dir, max_bytes)
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.expired = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Stored response of a job, or None on a miss, an expired entry or missing artifacts
+
+        Returns:
+            response dict with a 'cache' entry (hit, key, age_s)
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, artifacts, created FROM jobs WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, artifacts, created = row[0], json.loads(row[1]), row[2]
+            if now - created > self.ttl_seconds:
+                self._delete([key])
+                self.expired += 1
+                self.misses += 1
+                return None
+            if self.store is not None and not all(self.store.exists(a) for a in artifacts):
+                # artifacts were removed behind our back: the entry is useless
+                self._delete([key])
+                self.misses += 1
+                return None
+
+            self._touch([key])
+            self.hits += 1
+
+        response = json.loads(response)
+        response["cache"] = {"hit": True, "key": key, "age_s": round(now - created, 1)}
+        return response
+
+    def put(self, key: str, response: dict, artifacts: Optional[List[str]] = None, artifact_bytes: int = 0):
+        """
+        Store a finished job response
+
+        Args:
+            key: canonical_hash of the job
+            response: JSON-serializable handler response
+            artifacts: result-store keys the response references
+            artifact_bytes: total size of those artifacts
+        """
+        text = json.dumps(response)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (key, response, artifacts, nbytes, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text, json.dumps(artifacts or []), len(text) + artifact_bytes, now, now)
+            )
+            self._conn.commit()
+            self._evict()
+
+    def track(self, artifacts: List[str], artifact_bytes: int = 0):
+        """
+        Hand the artifacts of an uncached result (use_cache=False, degraded) to TTL / LRU eviction
+
+        The entry has no job key and holds no response, so lookups never return it; it only bounds
+        how long the artifacts stay in the result store.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (key, response, artifacts, nbytes, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (f"artifacts:{uuid.uuid4().hex}", "null", json.dumps(artifacts), artifact_bytes, now, now)
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _delete(self, keys: List[str]):
+        """Remove entries and the artifacts they reference (caller holds the lock)"""
+        if self.store is not None:
+            for key in keys:
+                row = self._conn.execute("SELECT artifacts FROM jobs WHERE key = ?", (key,)).fetchone()
+                for artifact in json.loads(row[0]) if row else []:
+                    try:
+                        self.store.delete(artifact)
+                    except Exception as e:
+                        print(f"Could not delete cached artifact {artifact}: {e}")
+        super()._delete(keys)
+
+    def _expire(self):
+        """Drop entries older than the TTL (caller holds the lock)"""
+        cutoff = time.time() - self.ttl_seconds
+        expired = [key for (key,) in self._conn.execute(
+            "SELECT key FROM jobs WHERE created < ?", (cutoff,)
+        ).fetchall()]
+        if expired:
+            self._delete(expired)
+            self.expired += len(expired)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current cache size"""
+        stats = super().stats()
+        stats["expired"] = self.expired
+        return stats
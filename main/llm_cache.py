@@ -0,0 +1,83 @@
+############################################
+## LLM Cache Module
+## Size-bounded on-disk cache of LLM responses (product chunks, organism prompts)
+## Key: sha256(model, prompt, sampling options, sample index)
+## Value: raw response text + parsed tags (SQLite)
+############################################
+
+import hashlib
+import json
+import time
+from typing import List, Optional, Tuple
+
+from main.sqlite_lru import SqliteLRU
+
+
+class LLMCache(SqliteLRU):
+    """SQLite backed LRU cache of LLM responses"""
+
+    db_file = "llm_responses.sqlite"
+    table = "responses"
+    columns = ("key TEXT PRIMARY KEY", "raw TEXT NOT NULL", "parsed TEXT NOT NULL", "nbytes INTEGER NOT NULL",
+               "last_access REAL NOT NULL")
+    index_name = "idx_responses_last_access"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024**2):
+        """
+        Open (or create) the cache database
+
+        Args:
+            cache_dir: directory holding llm_responses.sqlite
+            max_bytes: total payload size before least-recently-used entries are evicted
+        """
+        super().__init__(cache_dir, max_bytes)
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Optional[dict] = None, sample: int = 0) -> str:
+        """
+        Content address of one LLM call
+
+        Args:
+            model: Ollama model name
+            prompt: full prompt text
+            options: sampling options sent with the request
+            sample: index of repeated draws of the same prompt (each draw is cached separately)
+
+        Returns:
+            hex sha256 digest
+        """
+        h = hashlib.sha256()
+        for part in (model, json.dumps(options or {}, sort_keys=True), str(sample), prompt):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Cached (raw response, parsed tags) of a call, refreshing its LRU position
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT raw, parsed FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._touch([key])
+            self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, raw: str, parsed: List[str]):
+        """Store a response and evict least-recently-used entries beyond max_bytes"""
+        parsed_text = json.dumps(parsed)
+        nbytes = len(raw.encode()) + len(parsed_text.encode())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, raw, parsed, nbytes, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, raw, parsed_text, nbytes, time.time())
+            )
+            self._conn.commit()
+            self._evict()
+
+
+def open_llm_cache(cache_dir: str, max_bytes: int = 256 * 1024**2) -> LLMCache:
+    """Return the process-wide LLMCache for cache_dir (stats accumulate across jobs)"""
+    return LLMCache.open_shared(cache_dir, max_bytes=max_bytes)
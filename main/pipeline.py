@@ -0,0 +1,160 @@
+############################################
+## Pipeline Module
+## Small stage graph for the handler: independent stages run concurrently
+## (e.g. network/LLM-bound tagging next to compute-bound embedding)
+############################################
+
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+
+
+class Stage:
+    """One node of the stage graph"""
+
+    def __init__(self, fn: Callable, deps: Optional[List[str]] = None):
+        """
+        Args:
+            fn: callable run with the results of its dependencies as keyword arguments
+            deps: names of stages that must finish first
+        """
+        self.fn = fn
+        self.deps = deps or []
+
+
+class PipelineError(Exception):
+    """Raised when one or more stages failed; carries per-stage errors and timings"""
+
+    def __init__(self, errors: Dict[str, str], timings: Dict[str, float], results: Dict[str, object]):
+        self.errors = errors
+        self.timings = timings
+        self.results = results
+        super().__init__("; ".join(f"{name}: {error}" for name, error in errors.items()))
+
+
+def run_stages(stages: Dict[str, Stage], max_workers: Optional[int] = None):
+    """
+    Run a stage graph, starting every stage as soon as its dependencies have finished
+
+    A failing stage does not cancel stages that are independent of it; its dependents are skipped.
+
+    Args:
+        stages: stage name -> Stage
+        max_workers: thread pool size (default: one thread per stage)
+
+    Returns:
+        (results: stage name -> return value, timings: stage name -> wall seconds, plus 'total')
+
+    Raises:
+        PipelineError: if any stage failed or was skipped
+    """
+    for name, stage in stages.items():
+        missing = [dep for dep in stage.deps if dep not in stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages {missing}")
+
+    results: Dict[str, object] = {}
+    errors: Dict[str, str] = {}
+    timings: Dict[str, float] = {}
+    pending = dict(stages)
+    running = {}
+    start = time.perf_counter()
+
+    def timed(name: str, stage: Stage):
+        stage_start = time.perf_counter()
+        try:
+            return stage.fn(**{dep: results[dep] for dep in stage.deps})
+        finally:
+            timings[name] = round(time.perf_counter() - stage_start, 3)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(stages))) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(dep in errors for dep in stage.deps):
+                    errors[name] = f"skipped: dependency failed ({', '.join(d for d in stage.deps if d in errors)})"
+                    del pending[name]
+                elif all(dep in results for dep in stage.deps):
+                    running[executor.submit(timed, name, stage)] = name
+                    del pending[name]
+
+            if not running:
+                # only stages whose dependencies can never finish are left
+                for name in pending:
+                    errors[name] = "skipped: unresolved dependencies"
+                break
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"Stage '{name}' failed:\n{traceback.format_exc()}")
+                    errors[name] = f"{type(e).__name__}: {e}"
+
+    timings["total"] = round(time.perf_counter() - start, 3)
+    if errors:
+        raise PipelineError(errors, timings, results)
+    return results, timings
+
+
+class ResourceGate:
+    """Bounded slot pool for a resource shared by concurrent jobs (embedder, LLM server)"""
+
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = max(1, slots)
+        self.waiting = 0
+        self.active = 0
+        self._semaphore = threading.Semaphore(self.slots)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        """Hold one slot for the duration of the block, queueing if all slots are taken"""
+        with self._lock:
+            self.waiting += 1
+        self._semaphore.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._semaphore.release()
+
+    @property
+    def saturated(self) -> bool:
+        """True once every slot is busy and at least as many jobs again are queued behind them"""
+        return self.waiting >= self.slots
+
+    def stats(self) -> Dict[str, int]:
+        return {"slots": self.slots, "active": self.active, "waiting": self.waiting}
+
+
+def concurrency_target(running_jobs: int, gates: List[ResourceGate], max_concurrency: int) -> int:
+    """
+    Number of jobs a worker should run at once given the queue depth of its shared resources
+
+    Admit one more job while every resource can still start it without a long wait; hold the
+    current level once any resource has a full queue, so jobs are not piled onto a saturated
+    embedder or LLM server.
+
+    Args:
+        running_jobs: jobs currently running on the worker
+        gates: shared resources the jobs contend for
+        max_concurrency: hard upper bound
+
+    Returns:
+        target concurrency in [1, max_concurrency]
+    """
+    if any(gate.saturated for gate in gates):
+        target = running_jobs
+    else:
+        target = running_jobs + 1
+    return max(1, min(target, max_concurrency))
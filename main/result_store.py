@@ -0,0 +1,232 @@
+############################################
+## Result Store Module
+## Job results are written as artifacts (embedding matrix, validity mask, tags) to a store
+## and the handler returns a compact manifest (uri, shape, dtype, sha256) instead of inline JSON
+############################################
+
+import base64
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from main.esm_embedding import stack_embeddings
+
+RESULT_MODES = ("reference", "inline", "lists")
+ARTIFACTS = ("embeddings", "valid", "tags")
+
+
+class LocalStore:
+    """Object-store stand-in backed by a local directory (keys map to relative paths)"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return str(path)
+
+    def get(self, key: str) -> bytes:
+        with open(self.root / key, 'rb') as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+    def delete(self, key: str):
+        path = self.root / key
+        if path.exists():
+            path.unlink()
+
+
+class S3Store:
+    """S3-compatible object store (requires boto3); same interface as LocalStore"""
+
+    def __init__(self, url: str):
+        try:
+            import boto3
+        except ImportError as e:
+            raise ImportError("boto3 is required for s3:// result stores") from e
+        bucket, _, prefix = url[len("s3://"):].partition("/")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL"))
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key: str, data: bytes) -> str:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.ClientError:
+            return False
+        return True
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+def open_store(location: str):
+    """Result store for a location: 's3://bucket/prefix' or a local directory"""
+    if location.startswith("s3://"):
+        return S3Store(location)
+    return LocalStore(location)
+
+
+def npy_bytes(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def _put_entry(store, key: str, data: bytes, **meta) -> dict:
+    """Upload one artifact and describe it for the manifest"""
+    entry = {"uri": store.put(key, data), "bytes": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    entry.update(meta)
+    return entry
+
+
+def write_result_artifact(store, job_key: str, tags: List[str], embeddings: List[Optional[np.ndarray]],
+                          locus_tags: Optional[List[str]] = None, protein_ids: Optional[List[str]] = None,
+                          dtype: str = "float32", poolings: Optional[Dict[str, np.ndarray]] = None) -> dict:
+    """
+    Write a job result to the store and return its manifest
+
+    Artifacts under <job_key>/:
+        embeddings.npy  [N, D] matrix (zero rows for missing entries)
+        valid.npy       validity bitmask (np.packbits of N booleans)
+        tags.json       tags plus row identifiers
+        embeddings_<pooling>.npy  [N, D] matrix of every extra pooling (same rows and mask)
+
+    Args:
+        store: LocalStore / S3Store
+        job_key: artifact prefix of this job (e.g. genome stem)
+        tags: generated tags
+        embeddings: per-sequence embeddings (None for missing entries)
+        locus_tags, protein_ids: optional row identifiers
+        dtype: matrix dtype ('float32' or 'float16')
+        poolings: optional extra pooling matrices by name (see embed_sequences(pooled=...))
+
+    Returns:
+        manifest dict (uri, bytes, sha256 and shape/dtype per artifact; extra poolings under 'poolings')
+    """
+    matrix, valid = stack_embeddings(embeddings, dtype=dtype)
+    meta = {"tags": tags, "locus_tags": locus_tags, "protein_ids": protein_ids}
+
+    manifest = {
+        "job_key": job_key,
+        "embeddings": _put_entry(store, f"{job_key}/embeddings.npy", npy_bytes(matrix),
+                                 shape=list(matrix.shape), dtype=str(matrix.dtype)),
+        "valid": _put_entry(store, f"{job_key}/valid.npy", npy_bytes(np.packbits(valid)),
+                            n_valid=int(valid.sum()), encoding="packbits"),
+        "tags": _put_entry(store, f"{job_key}/tags.json", json.dumps(meta).encode("utf-8"),
+                           count=len(tags)),
+    }
+    if poolings:
+        manifest["poolings"] = {}
+        for name, pooled in poolings.items():
+            pooled = np.ascontiguousarray(pooled, dtype=dtype)
+            manifest["poolings"][name] = _put_entry(store, f"{job_key}/embeddings_{name}.npy", npy_bytes(pooled),
+                                                    shape=list(pooled.shape), dtype=str(pooled.dtype))
+    print(f"Wrote result artifact {job_key}: {matrix.shape} {matrix.dtype}, {len(tags)} tags"
+          + (f", poolings {sorted(poolings)}" if poolings else ""))
+    return manifest
+
+
+def _manifest_entries(manifest: dict) -> List[dict]:
+    """Every artifact entry of a manifest (fixed artifacts first, then extra poolings)"""
+    return [manifest[name] for name in ARTIFACTS] + list(manifest.get("poolings", {}).values())
+
+
+def manifest_keys(manifest: dict) -> List[str]:
+    """Store keys of every artifact in a manifest"""
+    return [f"{manifest['job_key']}/{Path(entry['uri']).name}" for entry in _manifest_entries(manifest)]
+
+
+def manifest_bytes(manifest: dict) -> int:
+    return sum(entry["bytes"] for entry in _manifest_entries(manifest))
+
+
+def encode_matrix(matrix: np.ndarray) -> dict:
+    """Compact JSON encoding of a matrix: base64 float16 bytes plus shape"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float16)
+    return {
+        "shape": list(matrix.shape),
+        "dtype": "float16",
+        "data": base64.b64encode(matrix.tobytes()).decode("ascii"),
+    }
+
+
+def inline_embeddings(embeddings: List[Optional[np.ndarray]],
+                      poolings: Optional[Dict[str, np.ndarray]] = None) -> dict:
+    """
+    Compact inline encoding: base64 float16 matrix plus base64 validity bitmask
+
+    Extra pooling matrices are added under 'poolings' (one encode_matrix payload per name, same mask).
+    """
+    matrix, valid = stack_embeddings(embeddings, dtype="float16")
+    payload = encode_matrix(matrix)
+    payload["valid"] = base64.b64encode(np.packbits(valid).tobytes()).decode("ascii")
+    if poolings:
+        payload["poolings"] = {name: encode_matrix(pooled) for name, pooled in poolings.items()}
+    return payload
+
+
+def decode_matrix(payload: dict) -> np.ndarray:
+    """Inverse of encode_matrix"""
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=payload["dtype"]).reshape(tuple(payload["shape"]))
+
+
+def decode_inline_embeddings(payload: dict):
+    """Inverse of inline_embeddings: (matrix [N, D], valid [N] bool); see decode_matrix for 'poolings'"""
+    shape = tuple(payload["shape"])
+    matrix = decode_matrix(payload)
+    valid = np.unpackbits(np.frombuffer(base64.b64decode(payload["valid"]), dtype=np.uint8))[:shape[0]]
+    return matrix, valid.astype(bool)
+
+
+def load_result_artifact(store, manifest: dict, verify: bool = True) -> Dict[str, object]:
+    """
+    Read a result back from its manifest
+
+    Args:
+        store: store the artifact was written to
+        manifest: dict returned by write_result_artifact
+        verify: check every artifact against its sha256
+
+    Returns:
+        dict with 'embeddings' matrix, 'valid' bool mask, 'tags', 'locus_tags', 'protein_ids' and
+        'poolings' (extra pooling matrices by name, empty if none were stored)
+    """
+    blobs = []
+    for entry, key in zip(_manifest_entries(manifest), manifest_keys(manifest)):
+        data = store.get(key)
+        if verify and hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for {entry['uri']}")
+        blobs.append(data)
+
+    embeddings, valid, tags = blobs[:len(ARTIFACTS)]
+    matrix = np.load(io.BytesIO(embeddings))
+    valid = np.unpackbits(np.load(io.BytesIO(valid)))[:matrix.shape[0]].astype(bool)
+    meta = json.loads(tags.decode("utf-8"))
+    poolings = {name: np.load(io.BytesIO(data))
+                for name, data in zip(manifest.get("poolings", {}), blobs[len(ARTIFACTS):])}
+    return {"embeddings": matrix, "valid": valid, "tags": meta["tags"],
+            "locus_tags": meta["locus_tags"], "protein_ids": meta["protein_ids"], "poolings": poolings}
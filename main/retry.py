@@ -0,0 +1,160 @@
+############################################
+## Retry Module
+## Shared retry policy for LLM calls: exponential backoff with full jitter, a per-job
+## attempt/time budget and a circuit breaker shared by every job of the worker
+############################################
+
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple, Type
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open"""
+
+
+class RetryBudgetExceeded(Exception):
+    """Raised when a job has used up its retry attempts or time"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, fails fast while open, lets one trial call through after reset_timeout"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """True if a call may go through (closed, or half-open trial)"""
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # one trial at a time: push the reopen deadline forward until it reports back
+                self.opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    self.trips += 1
+                    print(f"Circuit breaker '{self.name}' opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+
+
+class RetryPolicy:
+    """
+    Per-job retry policy
+
+    One instance is created per job so the attempt and time budget cover every call of that job;
+    the circuit breaker is shared across jobs.
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 budget_attempts: Optional[int] = None, budget_seconds: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 breaker_ignores: Tuple[Type[BaseException], ...] = (ValueError,)):
+        """
+        Args:
+            max_attempts: attempts per call (first try included)
+            base_delay, max_delay: backoff before retry k is uniform(0, min(max_delay, base_delay * 2**k))
+            budget_attempts: failed attempts allowed across the whole job (None: unbounded)
+            budget_seconds: wall time after which no more retries start (None: unbounded)
+            breaker: shared circuit breaker of the backend
+            breaker_ignores: errors that say nothing about backend health (e.g. unparsable output)
+                and do not count towards the breaker
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_attempts = budget_attempts
+        self.deadline = time.monotonic() + budget_seconds if budget_seconds is not None else None
+        self.breaker = breaker
+        self.breaker_ignores = breaker_ignores
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.failed_attempts = 0
+        self._lock = threading.Lock()
+
+    def _budget_left(self) -> bool:
+        if self.budget_attempts is not None and self.failed_attempts >= self.budget_attempts:
+            return False
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return False
+        return True
+
+    def call(self, fn: Callable, *args, on_error: Optional[Callable[[Exception], None]] = None, **kwargs):
+        """
+        Call fn until it succeeds or the policy gives up
+
+        Args:
+            fn: callable to run
+            on_error: optional callback receiving each failed attempt's exception
+
+        Returns:
+            fn's return value
+
+        Raises:
+            CircuitOpenError: the breaker is open
+            RetryBudgetExceeded: the job budget ran out before a successful attempt
+            Exception: the last error once max_attempts is reached
+        """
+        with self._lock:
+            self.calls += 1
+        for attempt in range(self.max_attempts):
+            if self.breaker is not None and not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit breaker '{self.breaker.name}' is open")
+            with self._lock:
+                self.attempts += 1
+                self.retries += attempt > 0
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if self.breaker is not None and not isinstance(e, self.breaker_ignores):
+                    self.breaker.record_failure()
+                with self._lock:
+                    self.failed_attempts += 1
+                    budget_left = self._budget_left()
+                if on_error is not None:
+                    on_error(e)
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                if not budget_left:
+                    raise RetryBudgetExceeded(f"Retry budget exhausted ({self.failed_attempts} failed attempts)") from e
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        stats = {"calls": self.calls, "attempts": self.attempts, "failed_attempts": self.failed_attempts,
+                 "retries": self.retries}
+        if self.breaker is not None:
+            stats["breaker"] = self.breaker.stats()
+        return stats
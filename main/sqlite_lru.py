@@ -0,0 +1,119 @@
+############################################
+## SQLite LRU Module
+## Shared base of the on-disk caches (embeddings, LLM responses, job results):
+## one SQLite table with key / nbytes / last_access columns, size-bounded LRU eviction,
+## hit/miss counters and a process-wide registry of open caches
+############################################
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+class SqliteLRU:
+    """
+    SQLite backed LRU store
+
+    Subclasses set the database file, table and column schema (which must include key, nbytes and
+    last_access) and implement their value format on top of the protected helpers. Deletion goes
+    through _delete and eviction calls _expire first, so subclasses can add TTLs or clean up data
+    stored outside the table.
+    """
+
+    db_file = "cache.sqlite"
+    table = "entries"
+    # column definitions of the table (schema hook)
+    columns = ("key TEXT PRIMARY KEY", "nbytes INTEGER NOT NULL", "last_access REAL NOT NULL")
+    index_name = "idx_entries_last_access"
+
+    _registry: Dict[Tuple[type, str], "SqliteLRU"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Open (or create) the cache database
+
+        Args:
+            cache_dir: directory holding db_file
+            max_bytes: total payload size before least-recently-used entries are evicted
+        """
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        self.path = str(Path(cache_dir) / self.db_file)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({', '.join(self.columns)})")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.index_name} ON {self.table}(last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def open_shared(cls, cache_dir: str, **kwargs) -> "SqliteLRU":
+        """Return the process-wide instance of this cache class for cache_dir (stats accumulate across jobs)"""
+        key = (cls, str(Path(cache_dir).resolve()))
+        with SqliteLRU._registry_lock:
+            if key not in SqliteLRU._registry:
+                SqliteLRU._registry[key] = cls(cache_dir, **kwargs)
+            return SqliteLRU._registry[key]
+
+    def _touch(self, keys: List[str]):
+        """Refresh the LRU position of keys (caller holds the lock)"""
+        now = time.time()
+        self._conn.executemany(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", [(now, k) for k in keys])
+        self._conn.commit()
+
+    def _delete(self, keys: List[str]):
+        """Remove entries (caller holds the lock)"""
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(k,) for k in keys])
+        self._conn.commit()
+
+    def _expire(self):
+        """Hook run before size eviction (caller holds the lock)"""
+
+    def _evict(self):
+        """Drop oldest entries until the payload fits in max_bytes (caller holds the lock)"""
+        self._expire()
+        total = self._conn.execute(f"SELECT COALESCE(SUM(nbytes), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        victims = []
+        freed = 0
+        for key, nbytes in self._conn.execute(
+            f"SELECT key, nbytes FROM {self.table} ORDER BY last_access ASC"
+        ).fetchall():
+            victims.append(key)
+            freed += nbytes
+            if freed >= excess:
+                break
+
+        self._delete(victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current cache size"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM {self.table}"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -2,15 +2,110 @@ import runpod
 
 import sys
 import os
+import asyncio
+import queue
+import shutil
+import threading
+import time
 from pathlib import Path
 
+# base_path = r"D:\Git_Clone\GeneExp"
+# sys.path.append(str(Path(base_path)))
+from main.generate_tags import (DROP_UNINFORMATIVE, LLM_GATE, LLM_PROMPT_TOKENS, STRUCTURED_OUTPUT, collect_tags,
+                                get_token_counter, llm_cache_stats, model as LLM_MODEL)
+from main.esm_embedding import DEFAULT_MODEL, embed_sequences, prewarm, registry_stats
+from main.gbff_ingest import is_gbff, load_gbff_input
+from main.result_store import (RESULT_MODES, encode_matrix, inline_embeddings, manifest_bytes, manifest_keys,
+                               open_store, write_result_artifact)
+from main.job_cache import JobCache, canonical_hash, file_sha256
+from main.pipeline import Stage, PipelineError, ResourceGate, concurrency_target, run_stages
 
-def handler(event):    
-    # base_path = r"D:\Git_Clone\GeneExp"
-    # sys.path.append(str(Path(base_path)))
-    from main.generate_tags import collect_tags
-    from main.esm_embedding import embed_sequences
+# Embedding inference mode for this endpoint: fp32 / fp16 / bf16 / int8 (see esm_embedding.DTYPES)
+EMBED_DTYPE = os.environ.get("EMBED_DTYPE", "fp32")
+# Number of embedding processes on CPU workers (1: embed in the handler process)
+EMBED_PROCS = int(os.environ.get("EMBED_PROCS", "1"))
+# Processes used to parse multi-record GBFF input (None: one per CPU)
+GBFF_PROCS = int(os.environ["GBFF_PROCS"]) if os.environ.get("GBFF_PROCS") else None
+# Where 'reference' results are written: a local directory or s3://bucket/prefix
+RESULT_STORE = os.environ.get("RESULT_STORE", "temp/results/")
+# Persistent embedding cache shared by every job of the worker
+EMBED_CACHE_DIR = os.environ.get("EMBED_CACHE_DIR", "temp/embedding_cache")
+# Whole-job result cache (TTL in seconds, size bound over responses + artifacts)
+JOB_CACHE_DIR = os.environ.get("JOB_CACHE_DIR", "temp/job_cache")
+JOB_CACHE_TTL = float(os.environ.get("JOB_CACHE_TTL", str(7 * 24 * 3600)))
+JOB_CACHE_MAX_BYTES = int(os.environ.get("JOB_CACHE_MAX_BYTES", str(5 * 1024**3)))
+# Jobs one worker may run at once with the async handler (1: plain synchronous handler)
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "1"))
+# Stream tag chunks and embedding batches as they finish (generator handler) instead of one final response.
+# Opt-in: with return_aggregate_stream, /status returns the list of every update instead of the response dict
+STREAM_RESULTS = os.environ.get("STREAM_RESULTS", "0") == "1"
 
+# Shared resources of concurrent jobs: one embedding stage at a time on the resident model;
+# LLM_GATE (generate_tags) admits as many LLM requests as the Ollama server serves in parallel
+EMBED_GATE = ResourceGate("embedder", int(os.environ.get("EMBED_SLOTS", "1")))
+
+running_jobs = 0
+running_lock = threading.Lock()
+
+_job_cache = None
+_job_cache_lock = threading.Lock()
+
+# Jobs currently using each per-job output directory (identical concurrent jobs share one)
+_job_dirs = {}
+_job_dirs_lock = threading.Lock()
+
+
+def get_job_cache() -> JobCache:
+    """Process-wide job cache, opened on first use"""
+    global _job_cache
+    with _job_cache_lock:
+        if _job_cache is None:
+            _job_cache = JobCache(JOB_CACHE_DIR, store=open_store(RESULT_STORE), ttl_seconds=JOB_CACHE_TTL,
+                                  max_bytes=JOB_CACHE_MAX_BYTES)
+        return _job_cache
+
+
+def job_versions(file_name, translations) -> dict:
+    """Everything besides the input fields that determines a job's result"""
+    versions = {"embedding_model": f"{DEFAULT_MODEL}:{EMBED_DTYPE}", "llm_model": LLM_MODEL,
+                "tag_prompting": f"{get_token_counter()[1]}:{LLM_PROMPT_TOKENS}:"
+                                 f"{int(DROP_UNINFORMATIVE)}:{int(STRUCTURED_OUTPUT)}"}
+    if not translations and is_gbff(file_name) and os.path.exists(file_name):
+        versions["gbff_sha256"] = file_sha256(file_name)
+    return versions
+
+
+def enter_job_dir(output_dir):
+    """Create a job's working directory (logs, tag files, embedding outputs and checkpoints)"""
+    with _job_dirs_lock:
+        _job_dirs[output_dir] = _job_dirs.get(output_dir, 0) + 1
+        os.makedirs(output_dir, exist_ok=True)
+
+
+def leave_job_dir(output_dir, keep=False):
+    """
+    Remove a job's working directory once the last job using it is done
+
+    Results are returned in the response or written to RESULT_STORE first, so nothing under
+    output_dir is needed afterwards.
+    keep: leave the directory for a resubmission (the embedding checkpoint of a failed job)
+    """
+    with _job_dirs_lock:
+        _job_dirs[output_dir] -= 1
+        if _job_dirs[output_dir] > 0:
+            return
+        del _job_dirs[output_dir]
+        if not keep:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def run_job(event, emit=None):
+    """
+    Run one job to completion and return its response
+
+    emit: optional callback receiving progress updates ('tags_chunk' / 'embedding_batch' dicts; embedding
+        batches carry the base64 matrix only when result_mode is 'inline')
+    """
     print(f"Worker Start")
     data = event
     
@@ -20,25 +115,216 @@ def handler(event):
     sub_strain = data['input'].get('sub_strain', "")
     products = data['input'].get('products', [])
     translations = data['input'].get('translations', [])
+    long_mode = data['input'].get('long_mode', False)
+    locus_tags = data['input'].get('locus_tags', None)
+    protein_ids = data['input'].get('protein_ids', None)
+    output_format = data['input'].get('output_format', "pickle")  # pickle (legacy, default) / npy / both
+    poolings = data['input'].get('poolings', None)
+    # extra poolings run on a separate path without checkpoints or long-sequence windows
+    checkpoint = data['input'].get('checkpoint', not poolings)
+    # False: bypass the LLM response cache when fresh samples are wanted
+    llm_cache = data['input'].get('llm_cache', True)
+    # reference: manifest of stored artifacts / inline: base64 float16 matrix / lists: nested lists (legacy)
+    result_mode = data['input'].get('result_mode', "reference")
+    if result_mode not in RESULT_MODES:
+        return {"status": "error", "message": f"Unknown result_mode '{result_mode}', expected one of {RESULT_MODES}"}
+    if poolings and (long_mode or checkpoint):
+        return {"status": "error", "message": "poolings cannot be combined with long_mode or checkpoint"}
+
+    # 'lists' responses hold numpy arrays and are not cached; llm_cache=False asks for fresh samples,
+    # so such a job neither reuses nor stores a whole-job result
+    use_cache = data['input'].get('use_cache', True) and llm_cache and result_mode != "lists"
+
+    job_start = time.perf_counter()
+    job_hash = canonical_hash(data['input'], job_versions(file_name, translations))
+    if use_cache:
+        cached = get_job_cache().get(job_hash)
+        if cached is not None:
+            cached["timings"] = {"total": round(time.perf_counter() - job_start, 3)}
+            print(f"Job cache hit {job_hash[:12]} (age {cached['cache']['age_s']}s)")
+            return cached
+
+    # concurrent jobs may share a file name: each writes its logs and outputs to its own directory,
+    # removed when the job ends
+    output_dir = f"temp/{job_hash[:12]}/"
+    enter_job_dir(output_dir)
+    keep_output = False
+    try:
+        # file_name alone is enough when it points to a (gzipped) GBFF: extract the CDS features here
+        ingest_seconds = None
+        if not translations and is_gbff(file_name):
+            ingest_start = time.perf_counter()
+            try:
+                parsed = load_gbff_input(file_name, num_procs=GBFF_PROCS)
+            except OSError as e:
+                return {"status": "error", "message": f"Could not read GBFF file {file_name}: {e}"}
+            ingest_seconds = round(time.perf_counter() - ingest_start, 3)
+            products, translations = parsed["products"], parsed["translations"]
+            locus_tags = locus_tags or parsed["locus_tags"]
+            protein_ids = protein_ids or parsed["protein_ids"]
+            organism = organism or parsed.get("organism")
+            strain = strain or parsed.get("strain", "")
+            sub_strain = sub_strain or parsed.get("sub_strain", "")
+
+        #########################################
+        # Tag generation (LLM/network-bound) and ESM2 embedding (compute-bound) are independent,
+        # so both stages run concurrently
+        embed_stats = {}
+        tag_stats = {}
+        # extra pooling matrices requested with 'poolings', returned next to the mean embeddings
+        pooled = {}
+        embedded = [0]
+
+        def on_chunk(chunk, n_chunks, chunk_tags):
+            emit({"type": "tags_chunk", "chunk": chunk, "n_chunks": n_chunks, "tags": chunk_tags})
+
+        def on_batch(indices, matrix):
+            # the matrix itself is only streamed for inline results; otherwise it stays in the result store
+            embedded[0] += len(indices)
+            update = {"type": "embedding_batch", "indices": [int(i) for i in indices],
+                      "done": embedded[0], "total": len(translations)}
+            if result_mode == "inline":
+                update["embeddings"] = encode_matrix(matrix)
+            emit(update)
+
+        def tag_stage():
+            # every LLM request of the stage takes its own LLM_GATE slot
+            return collect_tags(file_name, products, organism, strain, sub_strain, output_dir,
+                                on_chunk=on_chunk if emit else None, use_llm_cache=llm_cache, stats=tag_stats)
+
+        def embed_stage():
+            with EMBED_GATE.slot():
+                return embed_sequences(file_name, translations, output_dir,
+                                       cache_dir=EMBED_CACHE_DIR,
+                                       stats=embed_stats, long_mode=long_mode, output_format=output_format,
+                                       locus_tags=locus_tags, protein_ids=protein_ids, dtype=EMBED_DTYPE,
+                                       poolings=poolings, num_procs=EMBED_PROCS, checkpoint=checkpoint,
+                                       on_batch=on_batch if emit else None, pooled=pooled)
+
+        stages = {
+            "tags": Stage(tag_stage),
+            "embeddings": Stage(embed_stage),
+        }
+        try:
+            results, timings = run_stages(stages)
+        except PipelineError as e:
+            # a failed checkpointed embedding stage resumes from output_dir when the job is resubmitted
+            keep_output = checkpoint and "embeddings" in e.errors
+            return {
+                "status": "error",
+                "message": f"Pipeline failed: {e}",
+                "errors": e.errors,
+                "timings": e.timings,
+            }
+        tags, embeddings = results["tags"], results["embeddings"]
+        if ingest_seconds is not None:
+            timings["ingest"] = ingest_seconds
+        #########################################
+
+        print(f"Stage timings (s): {timings}")
+        response = {
+            "status": "success",
+            "message": (f"Generated {len(tags)} tags for {len(embeddings)} sequences "
+                        f"({embed_stats.get('unique', 0)} unique, dedup ratio {embed_stats.get('dedup_ratio', 0.0):.1%})."),
+            "embedding_stats": embed_stats,
+            "tag_stats": tag_stats,
+            "degraded": tag_stats.get("degraded", False),
+            "model_registry": registry_stats(),
+            "llm_cache": llm_cache_stats(),
+            "timings": timings
+        }
+        if result_mode == "reference":
+            response["result"] = write_result_artifact(open_store(RESULT_STORE), f"{Path(file_name).stem}-{job_hash[:12]}",
+                                                       tags, embeddings, locus_tags=locus_tags, protein_ids=protein_ids,
+                                                       poolings=pooled)
+        elif result_mode == "inline":
+            response["tags"] = tags
+            response["embeddings"] = inline_embeddings(embeddings, poolings=pooled)
+        else:
+            response["tags"] = tags
+            response["embeddings"] = embeddings
+            if pooled:
+                response["poolings"] = {name: [matrix[i] if emb is not None else None
+                                               for i, emb in enumerate(embeddings)]
+                                        for name, matrix in pooled.items()}
+
+        # a degraded result (LLM chunks given up on) is returned but not cached
+        manifest = response.get("result")
+        if use_cache and not response["degraded"]:
+            get_job_cache().put(job_hash, response, artifacts=manifest_keys(manifest) if manifest else [],
+                                artifact_bytes=manifest_bytes(manifest) if manifest else 0)
+            response["cache"] = {"hit": False, "key": job_hash}
+        elif manifest:
+            # the job cache still expires the stored artifacts
+            get_job_cache().track(manifest_keys(manifest), manifest_bytes(manifest))
+        return response
+    finally:
+        leave_job_dir(output_dir, keep=keep_output)
+
+
+_JOB_DONE = object()
+
+
+def handler(event):
+    """
+    Generator handler: yields each tag chunk and embedding batch as it finishes, then the final
+    response as {'type': 'result', ...}
+    """
+    updates = queue.Queue()
+    outcome = {}
+
+    def worker():
+        try:
+            outcome["response"] = run_job(event, emit=updates.put)
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            updates.put(_JOB_DONE)
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        update = updates.get()
+        if update is _JOB_DONE:
+            break
+        yield update
+
+    if "error" in outcome:
+        raise outcome["error"]
+    result = {"type": "result"}
+    result.update(outcome["response"])
+    yield result
+
 
-    output_dir = "temp/"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+async def async_handler(event):
+    """Async variant of run_job: the blocking job runs in a thread so the worker can take more jobs"""
+    global running_jobs
+    with running_lock:
+        running_jobs += 1
+    try:
+        return await asyncio.to_thread(run_job, event)
+    finally:
+        with running_lock:
+            running_jobs -= 1
 
-    #########################################
-    # Generate ESM2 embeddings
-    tags = collect_tags(file_name, products, organism, strain, sub_strain, output_dir)
-    embeddings = embed_sequences(file_name, translations, output_dir)
-    #########################################
-        
 
-    return {
-        "status": "success",
-        "message": f"Generated {len(tags)} tags for {len(embeddings)} sequences.",
-        "tags": tags,
-        "embeddings": embeddings
-    }
+def concurrency_modifier(current_concurrency):
+    """Scale per-worker job concurrency with the embedder and LLM queue depth"""
+    target = concurrency_target(running_jobs, [EMBED_GATE, LLM_GATE], MAX_CONCURRENCY)
+    if target != current_concurrency:
+        print(f"Concurrency {current_concurrency} -> {target} "
+              f"(embedder {EMBED_GATE.stats()}, llm {LLM_GATE.stats()})")
+    return target
 
 
 if __name__ == '__main__':
-    runpod.serverless.start({'handler': handler})
+    # Load ESM2 once at worker boot (in every shard process when EMBED_PROCS > 1); every job reuses it
+    prewarm(dtype=EMBED_DTYPE, num_procs=EMBED_PROCS)
+    # Tokenizer used to pack product prompts to LLM_PROMPT_TOKENS
+    get_token_counter()
+    if MAX_CONCURRENCY > 1:
+        runpod.serverless.start({'handler': async_handler, 'concurrency_modifier': concurrency_modifier})
+    elif STREAM_RESULTS:
+        # /stream/<job_id> delivers updates as they are yielded; /status returns them all at the end
+        runpod.serverless.start({'handler': handler, 'return_aggregate_stream': True})
+    else:
+        runpod.serverless.start({'handler': run_job})